@@ -0,0 +1,508 @@
+'''
+Benchmarks for the Graphlang compiler
+
+Run with `py benchmarks.py` to run all of them, or `py benchmarks.py lexer` to run one
+'''
+import contextlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src", "parser"))
+
+import lexer  # nopep8
+import tokens  # nopep8
+import interpreter  # nopep8
+import cache  # nopep8
+import codegen  # nopep8
+import diff  # nopep8
+import emit  # nopep8
+import batch  # nopep8
+import server  # nopep8
+import results  # nopep8
+
+
+def generate_program(lines: int) -> str:
+    """Generates a graphlang program with the given amount of lines"""
+    program = []
+    for i in range(lines // 5):
+        program.append(f"ns Generated{i} {{")
+        program.append(f"    width = {i} + 1  # comment")
+        program.append("    area = width * (width - 2) / 3")
+        program.append("    point = (width, area)")
+        program.append("}")
+    return "\n".join(program) + "\n"
+
+
+def timed(func, *args, repeat: int = 3) -> float:
+    """Returns the fastest time out of `repeat` runs of func(*args)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def legacy_lex(code: str) -> list[tuple[str, str]]:
+    """The original lexer, which recompiled the master pattern for every token"""
+    tokens = []
+    token_regex = '|'.join(
+        f'(?P<{pair[0]}>{pair[1]})' for pair in lexer.TOKEN_PATTERNS)
+    matcher = re.compile(token_regex).match(code)
+    while matcher is not None:
+        token_type = matcher.lastgroup
+        value = matcher.group(token_type)
+        if token_type == "literal":
+            tokens.append((token_type, int(value)))
+        elif token_type not in ["skip", "comment"]:
+            tokens.append((token_type, value))
+        matcher = re.compile(token_regex).match(code, matcher.end())
+    return tokens
+
+
+def bench_lexer():
+    code = generate_program(50_000)
+    count = len(lexer.lex(code))
+    before = timed(legacy_lex, code)
+    after = timed(lexer.lex, code)
+    streamed = timed(lambda: sum(1 for _ in lexer.tokenize(code)))
+    print(f"lexer: {count} tokens from 50000 lines")
+    print(f"    before:    {count / before:12,.0f} tokens/s")
+    print(f"    after:     {count / after:12,.0f} tokens/s")
+    print(f"    streaming: {count / streamed:12,.0f} tokens/s")
+
+
+def allocated(func, *args) -> tuple[object, int]:
+    """Returns the result of func(*args) and the amount of memory it kept allocated"""
+    tracemalloc.start()
+    result = func(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def bench_token_stream():
+    code = generate_program(50_000)
+    token_list, list_size = allocated(lexer.lex, code)
+    stream, stream_size = allocated(tokens.TokenStream.from_code, code)
+    count = len(stream)
+    print(f"token storage: {count} tokens")
+    print(f"    list of tuples: {list_size / count:6.1f} bytes/token")
+    print(f"    TokenStream:    {stream_size / count:6.1f} bytes/token"
+          f" (including offsets and line numbers)")
+
+    def count_lines_list():
+        return sum(1 for token in token_list if token[0] == "line")
+
+    def count_lines_stream():
+        line = tokens.LINE
+        return sum(1 for kind in stream.kinds if kind == line)
+
+    print(f"    kind checks (list):   {timed(count_lines_list) * 1000:8.2f} ms")
+    print(f"    kind checks (stream): {timed(count_lines_stream) * 1000:8.2f} ms")
+
+
+def macro_calls(calls: int) -> str:
+    """Generates a program that calls the Rectangle! macro from the shapes library many times"""
+    with open(os.path.join(os.path.dirname(__file__), "src", "stdlib", "shapes.graphlang"),
+              encoding="utf-8") as shapes:
+        program = [shapes.read()]
+    for i in range(calls):
+        program.append(f"box{i} = Rectangle!()")
+    return "\n".join(program) + "\n"
+
+
+def expand_with_inserts(code: str, expansion: list) -> int:
+    """Expands every macro call by inserting tokens one at a time, like the old parser"""
+    token_list = lexer.lex(code)
+    position = 0
+    while position < len(token_list) - 1:
+        if token_list[position + 1][1] == "!":
+            position += 4  # Rectangle ! ( )
+            for token in reversed(expansion):
+                token_list.insert(position + 1, token)
+        position += 1
+    return position
+
+
+def expand_with_splices(code: str, expansion: tokens.TokenStream) -> int:
+    """Expands every macro call by splicing the expansion into a TokenSource"""
+    source = tokens.TokenSource(tokens.TokenStream.from_code(code))
+    count = 0
+    while source.current() is not None:
+        following = source.peek(1)
+        if following is not None and following[1] == "!":
+            for _ in range(4):
+                source.advance()
+            source.splice(expansion)
+        if source.advance() is None:
+            break
+        count += 1
+    return count
+
+
+def bench_macro_splicing():
+    body = "\nns box {\nwidth = 1\nheight = 1\npolygon((0,0),(width,0),(width,height))\n}\n"
+    expansion = tokens.TokenStream.from_code(body)
+    expansion_list = lexer.lex(body)
+    print("macro expansion: time per Rectangle!() call")
+    for calls in (500, 1000, 2000, 4000):
+        code = macro_calls(calls)
+        before = timed(expand_with_inserts, code, expansion_list, repeat=1)
+        after = timed(expand_with_splices, code, expansion)
+        print(f"    {calls:5} calls: inserts {before / calls * 1e6:8.1f} us,"
+              f" splices {after / calls * 1e6:6.1f} us")
+
+
+def cache_env(directory: str) -> dict[str, str]:
+    """The environment for a compiler process that keeps its caches in directory, not the user's own"""
+    return {**os.environ, "GRAPHLANG_CACHE_DIR": os.path.join(directory, "cache")}
+
+
+def compile_program(code: str, **options) -> interpreter.GraphLangInterpreter:
+    """Compiles a program without any console output, or the module cache unless one is given"""
+    options.setdefault("module_cache", cache.ModuleCache(enabled=False))
+    compiler = interpreter.GraphLangInterpreter(code, **options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        compiler.parse_program()
+    return compiler
+
+
+def bench_macro_compile():
+    print("compiling Rectangle!() calls: time per call")
+    for calls in (250, 500, 1000, 2000):
+        code = "import shapes\n" + "\n".join(f"box{i} = Rectangle!()" for i in range(calls))
+        elapsed = timed(compile_program, code, repeat=1)
+        print(f"    {calls:5} calls: {elapsed / calls * 1e6:8.1f} us")
+
+
+def nested_namespaces(variables: int) -> str:
+    """Generates a program defining the given amount of variables, in namespaces three deep"""
+    program = []
+    per_namespace = 10
+    for i in range(variables // (per_namespace * 3)):
+        program.append(f"ns outer{i} {{")
+        for depth in range(3):
+            program.append(f"ns level{depth} {{")
+            for j in range(per_namespace):
+                program.append(f"value{j} = {j}")
+        program.extend(["}"] * 4)
+    return "\n".join(program) + "\n"
+
+
+def bench_symbols():
+    print("declaring variables in nested namespaces: time per variable")
+    for variables in (1250, 2500, 5000, 10000):
+        code = nested_namespaces(variables)
+        elapsed = timed(compile_program, code, repeat=1)
+        print(f"    {variables:6} variables: {elapsed / variables * 1e6:8.1f} us")
+
+
+def bench_latex():
+    print("compiling one polygon with many points: time per point")
+    for points in (2500, 10000, 40000):
+        code = "shape = polygon(" + ",".join(f"({i},{i}*x+1)" for i in range(points)) + ")\n"
+        elapsed = timed(compile_program, code, repeat=1)
+        print(f"    {points:6} points: {elapsed / points * 1e6:8.1f} us")
+
+
+def bench_stages():
+    code = generate_program(20_000)
+    compiler = compile_program(code)
+    total = timed(compile_program, code, repeat=1)
+    generate = timed(lambda: codegen.CodeGenerator().generate(compiler.program))
+    print("parse and codegen of 20000 lines")
+    print(f"    parse:   {(total - generate) * 1000:8.1f} ms")
+    print(f"    codegen: {generate * 1000:8.1f} ms")
+
+
+STDLIB = os.path.join(os.path.dirname(__file__), "src", "stdlib")
+
+
+def bench_macro_templates():
+    with open(os.path.join(STDLIB, "shapes.graphlang"), encoding="utf-8") as shapes:
+        template = compile_program(shapes.read()).macros["Rectangle"]
+    # the old parser kept the body as one string and lexed it again for every call
+    latex = "".join(str(value) for value in template.tokens.values)
+
+    def replace_and_lex(calls):
+        for i in range(calls):
+            tokens.TokenStream.from_code(latex.replace("{__name__}", f" box{i}"))
+
+    def instantiate(calls):
+        source = tokens.TokenSource(tokens.TokenStream.from_code("box = 0\n"))
+        for i in range(calls):
+            name = tokens.TokenStream.from_tokens([(tokens.IDENTIFIER, f"box{i}")])
+            source.splice_slices(*template.instantiate([name]))
+
+    print("instantiating Rectangle!: time per call")
+    for calls in (1000, 5000, 20000):
+        before = timed(replace_and_lex, calls, repeat=1)
+        after = timed(instantiate, calls, repeat=1)
+        print(f"    {calls:6} calls: replace + lex {before / calls * 1e6:7.1f} us,"
+              f" template {after / calls * 1e6:5.1f} us")
+
+
+def bench_module_cache():
+    paths = [os.path.join(STDLIB, name + ".graphlang") for name in ("colors", "graphics", "shapes")]
+    texts = [open(path, encoding="utf-8").read() for path in paths]
+    code = "import colors\nimport graphics\nimport shapes\n"
+    with tempfile.TemporaryDirectory() as directory:
+        for path, text in zip(paths, texts):
+            cache.ModuleCache(directory).put(path, text, tokens.TokenStream.from_code(text))
+
+        def lex_modules():
+            for text in texts:
+                tokens.TokenStream.from_code(text)
+
+        def load_modules():
+            module_cache = cache.ModuleCache(directory)
+            for path, text in zip(paths, texts):
+                module_cache.get(path, text)
+
+        print("stdlib modules (colors, graphics, shapes)")
+        print(f"    lexing:            {timed(lex_modules) * 1000:8.3f} ms")
+        print(f"    loading from disk: {timed(load_modules) * 1000:8.3f} ms")
+        uncached = timed(lambda: compile_program(
+            code, module_cache=cache.ModuleCache(enabled=False)))
+        cached = timed(lambda: compile_program(code, module_cache=cache.ModuleCache(directory)))
+        print(f"    compile, --no-cache:    {uncached * 1000:8.3f} ms")
+        print(f"    compile, warm cache:    {cached * 1000:8.3f} ms (compiled modules reused)")
+
+
+def operator_chain(operators: int) -> str:
+    """Generates one expression with the given amount of operators, mixing precedences"""
+    terms = "".join(f"{'+*-/^'[i % 5]}{i % 7 + 1}" for i in range(operators))
+    return f"x = 1{terms}\n"
+
+
+def bench_operators():
+    print("one long expression: time per operator")
+    for operators in (1000, 25_000, 100_000):
+        seconds = timed(compile_program, operator_chain(operators), repeat=1)
+        print(f"    {operators:6} operators: {seconds / operators * 1e6:6.1f} us")
+
+
+def bench_folding():
+    code = macro_calls(500) + generate_program(2500)
+    print("arithmetic desmos evaluates, by optimisation level")
+    for level in (0, 1, 2):
+        compiler = compile_program(code, module_cache=cache.ModuleCache(enabled=False), optimise=level)
+        latex = "".join(expression.get("latex", "") for expression in compiler.output["expressions"]["list"])
+        operators = len(re.findall(r"[-+*/^]", latex))
+        elapsed = timed(lambda: compile_program(code, module_cache=cache.ModuleCache(enabled=False),
+                                                optimise=level), repeat=1)
+        print(f"    -O{level}: {operators:6} operators in the output, compiled in {elapsed * 1000:7.1f} ms")
+
+
+def bench_hoisting():
+    code = macro_calls(500)
+    print("500 Rectangle!() calls at -O2, by --cse-min-size / --cse-min-count")
+    for min_size, min_count in ((2, 2), (3, 2), (5, 2), (3, 3), (100, 2)):
+        compiler = compile_program(code, module_cache=cache.ModuleCache(enabled=False), optimise=2,
+                                   cse_min_size=min_size, cse_min_count=min_count)
+        latex = "".join(expression.get("latex", "") for expression in compiler.output["expressions"]["list"])
+        operators = len(re.findall(r"[-+*/^]", latex))
+        print(f"    {min_size:3} / {min_count}: {compiler.hoisted:5} helpers,"
+              f" {operators:6} operators in the output")
+
+
+def bench_wakascopes():
+    code = "".join(f"fn f{i}(a, b) {{\n    sin(a*b+{i}) + cos(a*b+{i}) + (a*b+{i})^2\n}}\n" for i in range(200))
+    print("200 functions repeating a calculation: operations desmos does per call")
+    for wakascopes in (False, True):
+        compiler = compile_program(code, module_cache=cache.ModuleCache(enabled=False), wakascopes=wakascopes)
+        latex = "".join(expression.get("latex", "") for expression in compiler.output["expressions"]["list"])
+        operators = len(re.findall(r"[-+*/^]", latex))
+        elapsed = timed(lambda: compile_program(code, module_cache=cache.ModuleCache(enabled=False),
+                                                wakascopes=wakascopes), repeat=1)
+        print(f"    wakascopes {'on ' if wakascopes else 'off'}: {operators / 200:4.1f} operations,"
+              f" compiled in {elapsed * 1000:6.1f} ms")
+
+
+def bench_watch():
+    code = generate_program(5000)
+    edited = code.replace("width = 7 + 1", "width = 7 + 2", 1)
+    module_cache = cache.ModuleCache(enabled=False)
+
+    def compile_incremental(code, parsed):
+        compiler = interpreter.GraphLangInterpreter(code, module_cache=module_cache, stable_ids=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            parsed = compiler.parse_incremental(parsed)
+        return compiler, parsed
+
+    print("watch mode, 5000 lines")
+    start = time.perf_counter()
+    first, parsed = compile_incremental(code, {})
+    print(f"    first compile:          {(time.perf_counter() - start) * 1000:7.1f} ms")
+    start = time.perf_counter()
+    compiler, _ = compile_incremental(edited, parsed)
+    print(f"    after a one line edit:  {(time.perf_counter() - start) * 1000:7.1f} ms,"
+          f" {compiler.reparsed} statement parsed again")
+    ids = [expression["id"] for expression in first.output["expressions"]["list"]]
+    kept = sum(a == b for a, b in zip(ids, (expression["id"] for expression in compiler.output["expressions"]["list"])))
+    print(f"    ids kept: {kept} of {len(ids)}")
+
+
+def bench_diff():
+    code = generate_program(5000)
+    old = compile_program(code, stable_ids=True).output
+    new = compile_program(code.replace("width = 7 + 1", "width = 7 + 2", 1), stable_ids=True).output
+    patch = diff.diff_states(old, new)
+    print("graph state patch after a one line edit, 5000 lines")
+    print(f"    full state: {len(json.dumps(new)):10,} bytes")
+    elapsed = timed(diff.diff_states, old, new)
+    print(f"    patch:      {len(json.dumps(patch)):10,} bytes, made in {elapsed * 1000:.1f} ms")
+
+
+def peak_allocated(func, *args) -> int:
+    """Returns the most memory func(*args) had allocated at once"""
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def bench_output():
+    output = compile_program(generate_program(20_000)).output
+    with open(os.devnull, "wt", encoding="utf-8") as file:
+        before = peak_allocated(lambda: file.write(json.dumps(output)))
+        after = peak_allocated(emit.write_state, output, file)
+        print(f"writing the graph of 20000 lines, {len(output['expressions']['list'])} expressions")
+        dumps_time = timed(lambda: file.write(json.dumps(output)))
+        stream_time = timed(emit.write_state, output, file)
+        print(f"    json.dumps:  {before / 1024:10,.0f} KiB peak, {dumps_time * 1000:6.1f} ms")
+        print(f"    write_state: {after / 1024:10,.0f} KiB peak, {stream_time * 1000:6.1f} ms")
+
+
+def bench_batch():
+    workers = os.cpu_count()
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(16):
+            with open(os.path.join(directory, f"graph{i}.graphlang"), "wt", encoding="utf-8") as file:
+                file.write("import shapes\n" + generate_program(1000))
+        files = batch.find_files(directory)
+        script = os.path.join(os.path.dirname(__file__), "src", "parser", "interpreter.py")
+        start = time.perf_counter()
+        for path in files:
+            subprocess.run([sys.executable, script, path, "--out", path + ".json"], check=True,
+                           stdout=subprocess.DEVNULL, env=cache_env(directory))
+        before = time.perf_counter() - start
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = batch.batch(files, workers=workers,
+                                  module_cache=cache.ModuleCache(os.path.join(directory, "batch-cache")))
+        after = time.perf_counter() - start
+    print("batch: 16 files of 1000 lines")
+    print(f"    one process each:       {before:6.2f} s")
+    failed = sum(result[2] is not None for result in results.values())
+    print(f"    batch on {workers:2} processes: {after:6.2f} s, {failed} failed")
+
+
+def bench_serve():
+    code = "import shapes\n" + generate_program(100)
+    script = os.path.join(os.path.dirname(__file__), "src", "parser", "interpreter.py")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "graph.graphlang")
+        with open(path, "wt", encoding="utf-8") as file:
+            file.write(code)
+        before = timed(lambda: subprocess.run([sys.executable, script, path, "--stdout"], check=True,
+                                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                              env=cache_env(directory)))
+        compile_server = server.CompileServer(cache.ModuleCache(os.path.join(directory, "server-cache")))
+        request = json.dumps({"id": 1, "source": code})
+        compile_server.handle(request)
+        after = timed(compile_server.handle, request, repeat=20)
+    print("compiling 100 lines that import shapes")
+    print(f"    new process:    {before * 1000:7.1f} ms")
+    print(f"    compile server: {after * 1000:7.1f} ms")
+
+
+def bench_startup():
+    script = os.path.join(os.path.dirname(__file__), "src", "parser", "interpreter.py")
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        def run(*args):
+            subprocess.run([sys.executable, *args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           env=cache_env(directory))
+
+        path = os.path.join(directory, "graph.graphlang")
+        with open(path, "wt", encoding="utf-8") as file:
+            file.write("x = 1\ny = x + 2\n")
+        python = timed(run, "-c", "pass", repeat=10)
+        imports = timed(run, "-c", f"import sys; sys.path.insert(0, {os.path.dirname(script)!r}); import interpreter",
+                        repeat=10)
+        headless = timed(run, script, path, "--out", path + ".json", repeat=10)
+    print("cold start, compiling a two line graph headless")
+    print(f"    python on its own:       {python * 1000:6.1f} ms")
+    print(f"    importing the compiler: +{(imports - python) * 1000:5.1f} ms")
+    print(f"    compiling:              +{(headless - imports) * 1000:5.1f} ms")
+    print(f"    total:                   {headless * 1000:6.1f} ms")
+
+
+def bench_results():
+    code = "import shapes\n" + generate_program(5000)
+    with tempfile.TemporaryDirectory() as directory:
+        result_cache = results.ResultCache(directory=directory)
+        uncached = timed(compile_program, code)
+        compile_program(code, result_cache=result_cache)
+        memory = timed(lambda: compile_program(code, result_cache=result_cache))
+        disk = timed(lambda: compile_program(code, result_cache=results.ResultCache(directory=directory)))
+    print("compiling 5000 lines again")
+    print(f"    without the result cache: {uncached * 1000:7.1f} ms")
+    print(f"    from memory:              {memory * 1000:7.1f} ms")
+    print(f"    from disk:                {disk * 1000:7.1f} ms")
+
+
+def bench_tree_shaking():
+    with open(os.path.join(STDLIB, "colors.graphlang"), encoding="utf-8") as colors:
+        module = colors.read()
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "colors.graphlang"), "w", encoding="utf-8") as colors:
+            colors.write(module)
+        code = "import colors\nfill = colors.red\n\nline = colors.blue\n\ny = x\n"
+        filename = os.path.join(directory, "main.graphlang")
+        print("import colors, using two of them: expressions desmos has to evaluate")
+        for level in (0, 1):
+            compiler = compile_program(code, filename=filename, module_cache=cache.ModuleCache(enabled=False),
+                                       optimise=level)
+            print(f"    -O{level}: {len(compiler.output['expressions']['list']):4} expressions"
+                  f" ({compiler.removed} removed)")
+
+
+BENCHMARKS = {
+    "lexer": bench_lexer,
+    "tokens": bench_token_stream,
+    "macros": bench_macro_splicing,
+    "macro_compile": bench_macro_compile,
+    "macro_templates": bench_macro_templates,
+    "symbols": bench_symbols,
+    "latex": bench_latex,
+    "stages": bench_stages,
+    "module_cache": bench_module_cache,
+    "operators": bench_operators,
+    "folding": bench_folding,
+    "tree_shaking": bench_tree_shaking,
+    "hoisting": bench_hoisting,
+    "wakascopes": bench_wakascopes,
+    "watch": bench_watch,
+    "diff": bench_diff,
+    "output": bench_output,
+    "batch": bench_batch,
+    "serve": bench_serve,
+    "startup": bench_startup,
+    "results": bench_results,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
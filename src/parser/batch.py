@@ -0,0 +1,148 @@
+'''
+Batch compilation for the Graphlang compiler
+
+`interpreter.py --batch graphs` compiles every .graphlang file in the
+graphs directory (or matching a glob like "graphs/**/*.graphlang") on a
+pool of worker processes, writing each graph to a .json file of its own.
+
+The standard library is lexed into the module cache before the workers
+start, so every worker finds it there instead of lexing it again. Each
+worker keeps one module cache for all the files it compiles, so modules
+they share are only read once per worker.
+'''
+import concurrent.futures
+import contextlib
+import glob
+import io
+import os
+import time
+
+from Utils import colors
+from cache import ModuleCache
+from emit import write_state
+from imports import warm_cache
+import interpreter
+
+# set in each worker process by start_worker
+_module_cache: ModuleCache | None = None
+_result_cache = None
+_options: dict = {}
+
+
+def find_files(pattern: str) -> list[str]:
+    """
+    Returns the files to compile, sorted
+
+    Arguments:
+        pattern -- a directory, searched for .graphlang files in it and its subdirectories, or a glob
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "**", "*.graphlang")
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+
+def output_path(path: str, out_dir: str | None, root: str) -> str:
+    """
+    Returns where the graph of a file is written
+
+    Arguments:
+        path -- the file being compiled
+        out_dir -- the directory to write graphs to, or None to write them next to the files
+        root -- the directory all the files are in, whose layout is kept inside out_dir
+    """
+    name = os.path.splitext(path)[0] + ".json"
+    if out_dir is None:
+        return name
+    return os.path.join(out_dir, os.path.relpath(name, root))
+
+
+def start_worker(module_cache: ModuleCache, result_cache, options: dict):
+    """Sets up a worker process with the caches and compiler options every file is compiled with"""
+    global _module_cache, _result_cache, _options
+    _module_cache = module_cache
+    _result_cache = result_cache
+    _options = options
+
+
+def compile_file(path: str, out_path: str) -> tuple[float, int, str | None]:
+    """
+    Compiles one file in a worker process and writes its graph
+
+    Returns:
+        (seconds taken, expressions in the graph, the error message or None)
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, "rt", encoding="utf-8") as file:
+            code = file.read()
+        with contextlib.redirect_stdout(io.StringIO()):
+            compiler = interpreter.GraphLangInterpreter(code, filename=path, module_cache=_module_cache,
+                                                        result_cache=_result_cache, **_options)
+            compiler.parse_program()
+        os.makedirs(os.path.dirname(out_path) or os.curdir, exist_ok=True)
+        with open(out_path, "wt", encoding="utf-8") as file:
+            write_state(compiler.output, file)
+    except (interpreter.Error, OSError) as error:
+        return time.perf_counter() - start, 0, str(error)
+    return time.perf_counter() - start, len(compiler.output["expressions"]["list"]), None
+
+
+def batch(files: list[str], out_dir: str | None = None, workers: int | None = None,
+          module_cache: ModuleCache | None = None, options: dict | None = None, result_cache=None) -> dict[str, tuple]:
+    """
+    Compiles files on a pool of worker processes, printing each one as it finishes
+
+    Arguments:
+        files -- the files to compile
+        out_dir -- the directory to write graphs to, or None to write them next to the files
+        workers -- how many processes to compile on, defaults to one per CPU
+        module_cache -- the module cache, warmed with the standard library and handed to every worker
+        options -- keyword arguments for GraphLangInterpreter
+        result_cache -- a results.ResultCache for every worker to keep and reuse compiled graphs in
+
+    Returns:
+        each file's (seconds taken, expressions in the graph, the error message or None)
+    """
+    module_cache = module_cache if module_cache is not None else ModuleCache()
+    warm_cache(module_cache)
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files]) if files else os.curdir
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=start_worker,
+                                                initargs=(module_cache, result_cache, options or {})) as pool:
+        futures = {pool.submit(compile_file, path, output_path(os.path.abspath(path), out_dir, root)): path
+                   for path in files}
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as error:  # the worker crashed, or the compiler has a bug
+                results[path] = (0.0, 0, f"{type(error).__name__}: {error}")
+            seconds, expressions, error = results[path]
+            if error is None:
+                print(colors.GREEN + f"{path}: {expressions} expressions in {seconds * 1000:.1f} ms" + colors.END)
+            else:
+                print(colors.RED + f"{path}: failed" + colors.END)
+    return results
+
+
+def summary(results: dict[str, tuple], elapsed: float, workers: int) -> str:
+    """
+    Describes a batch: how long it took, the slowest files and every failure
+
+    Arguments:
+        results -- what batch returned
+        elapsed -- how long the whole batch took, in seconds
+        workers -- how many processes it ran on
+    """
+    failed = {path: result[2] for path, result in results.items() if result[2] is not None}
+    compiling = sum(result[0] for result in results.values())
+    lines = [f"Compiled {len(results) - len(failed)} of {len(results)} files in {elapsed:.2f} s "
+             f"on {workers} worker{'s' if workers != 1 else ''} ({compiling:.2f} s of compiling, "
+             f"{compiling / max(len(results), 1) * 1000:.1f} ms per file)"]
+    slowest = sorted(results, key=lambda path: results[path][0], reverse=True)[:3]
+    if len(results) > 1:
+        lines.append("Slowest: " + ", ".join(f"{path} ({results[path][0] * 1000:.1f} ms)" for path in slowest))
+    for path, error in sorted(failed.items()):
+        lines.append(colors.RED + f"Failed: {path}" + colors.END)
+        lines.append(error.lstrip("\n"))
+    return "\n".join(lines)
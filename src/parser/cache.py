@@ -0,0 +1,214 @@
+'''
+On-disk cache of lexed and compiled Graphlang modules
+
+Each imported file is stored as one compact binary file holding its token
+stream and the names it defines at the top level. An entry is only used if
+the file's contents, the compiler version and the Python version all match,
+otherwise it is re-lexed and overwritten.
+
+Compiled modules (artifacts) are stored the same way: the desmos expressions
+a module compiled to, plus what the compiler needs to replay the import
+without parsing it again. Their ids are relocated when they are reused.
+'''
+import marshal
+import os
+import sys
+
+import lexer
+from tokens import SourceFile, TokenStream, KEYWORD, IDENTIFIER, PUNCTUATION, LINE
+
+# bump whenever the cached data would change for the same source file
+COMPILER_VERSION: str = "3.3"
+
+DEFAULT_CACHE_DIR: str = os.environ.get(
+    "GRAPHLANG_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "graphlang"))
+
+# anything that changes how a file is lexed invalidates the cache
+_CACHE_TAG: str = f"{COMPILER_VERSION}:{sys.version_info[0]}.{sys.version_info[1]}:{lexer.TOKEN_REGEX.pattern}"
+
+
+def content_hash(text: str) -> str:
+    """Returns the hash of a file's contents, as stored in the cache"""
+    import hashlib  # imported on first use, as programs without imports never need it
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def top_level_symbols(stream: TokenStream) -> tuple[str, ...]:
+    """
+    Finds the names a module defines outside of any braces:
+    variables (`name = ...`), functions, namespaces and macros
+
+    Arguments:
+        stream -- the module's tokens
+
+    Returns:
+        the names, in the order they are defined
+    """
+    kinds = stream.kinds
+    values = stream.values
+    symbols = []
+    depth = 0
+    statement_start = True
+    for index in range(len(kinds)):
+        kind = kinds[index]
+        value = values[index]
+        if kind == LINE:
+            statement_start = True
+            continue
+        if depth == 0 and statement_start and index + 1 < len(kinds):
+            if kind == KEYWORD and value in ("fn", "ns", "macro") and kinds[index + 1] == IDENTIFIER:
+                symbols.append(values[index + 1])
+            elif kind == IDENTIFIER and values[index + 1] == "=":
+                symbols.append(value)
+        statement_start = False
+        if kind == PUNCTUATION:
+            if value == "{":
+                depth += 1
+            elif value == "}":
+                depth -= 1
+    return tuple(symbols)
+
+
+class ModuleCache:
+    """Cache of lexed modules, kept in memory and in a directory on disk
+
+    Arguments:
+        directory -- where to keep the cache files
+        enabled -- if False, nothing is ever read or written
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        self.memory: dict[str, tuple[str, TokenStream, tuple[str, ...]]] = {}
+        self.artifacts: dict[tuple, dict] = {}
+
+    def entry_path(self, path: str) -> str:
+        """Returns the cache file used for a module"""
+        name = content_hash(os.path.abspath(path))
+        return os.path.join(self.directory, name + ".glc")
+
+    def get(self, path: str, text: str) -> tuple[TokenStream, tuple[str, ...]] | None:
+        """
+        Looks up a module in the cache
+
+        Arguments:
+            path -- the path of the module
+            text -- the current contents of the module
+
+        Returns:
+            (tokens, top level symbols), or None if the module isn't cached or is out of date
+        """
+        if not self.enabled:
+            return None
+        digest = content_hash(text)
+        cached = self.memory.get(path)
+        if cached is not None and cached[0] == digest:
+            return cached[1], cached[2]
+        try:
+            with open(self.entry_path(path), "rb") as file:
+                tag, stored_digest, kinds, values, offsets, lines, symbols = marshal.load(file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if tag != _CACHE_TAG or stored_digest != digest:
+            return None
+        stream = TokenStream(SourceFile(path, text))
+        stream.kinds.frombytes(kinds)
+        stream.values = values  # marshal keeps strings interned
+        stream.offsets.frombytes(offsets)
+        stream.lines.frombytes(lines)
+        self.memory[path] = (digest, stream, symbols)
+        return stream, symbols
+
+    def put(self, path: str, text: str, stream: TokenStream) -> tuple[str, ...]:
+        """
+        Stores a lexed module in the cache, replacing any older version of it
+
+        Arguments:
+            path -- the path of the module
+            text -- the contents the tokens were lexed from
+            stream -- the module's tokens
+
+        Returns:
+            the module's top level symbols
+        """
+        symbols = top_level_symbols(stream)
+        if not self.enabled:
+            return symbols
+        digest = content_hash(text)
+        self.memory[path] = (digest, stream, symbols)
+        data = marshal.dumps((_CACHE_TAG, digest, stream.kinds.tobytes(), stream.values,
+                              stream.offsets.tobytes(), stream.lines.tobytes(), symbols))
+        self.write(self.entry_path(path), data)
+        return symbols
+
+    def artifact_path(self, key: tuple) -> str:
+        """Returns the cache file used for a compiled module"""
+        name = content_hash(repr(key))
+        return os.path.join(self.directory, name + ".glc")
+
+    def get_artifact(self, key: tuple) -> dict | None:
+        """
+        Looks up a compiled module
+
+        Arguments:
+            key -- everything the compiled output depends on, see GraphLangInterpreter.artifact_key
+
+        Returns:
+            the artifact stored by put_artifact, or None
+        """
+        if not self.enabled:
+            return None
+        artifact = self.artifacts.get(key)
+        if artifact is not None:
+            return artifact
+        try:
+            with open(self.artifact_path(key), "rb") as file:
+                tag, stored_key, artifact = marshal.load(file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if tag != _CACHE_TAG or stored_key != repr(key):
+            return None
+        self.artifacts[key] = artifact
+        return artifact
+
+    def put_artifact(self, key: tuple, artifact: dict) -> None:
+        """
+        Stores a compiled module
+
+        Arguments:
+            key -- everything the compiled output depends on
+            artifact -- the compiled module, only made of dicts, lists, strings, numbers and None
+        """
+        if not self.enabled:
+            return
+        data = marshal.dumps((_CACHE_TAG, repr(key), artifact))
+        self.artifacts[key] = marshal.loads(data)[2]  # keep a copy the caller can't change
+        self.write(self.artifact_path(key), data)
+
+    def write(self, entry: str, data: bytes) -> None:
+        """Writes a cache file, ignoring any errors"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write to a temporary file first so a half written entry is never read,
+            # named after the process and thread so two compiles writing the same entry don't collide
+            import threading  # imported on first use, like hashlib
+            temporary = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, entry)
+        except OSError:
+            pass  # the cache is only an optimisation
+
+    def clear(self) -> None:
+        """Deletes every cached module"""
+        self.memory.clear()
+        self.artifacts.clear()
+        try:
+            entries = os.listdir(self.directory)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.endswith(".glc"):
+                os.remove(os.path.join(self.directory, entry))
@@ -0,0 +1,393 @@
+'''
+Desmos code generation for the Graphlang compiler
+
+Walks the syntax tree built by the parser and turns it into the desmos graph
+state: one expression per statement, folders for namespaces and text for
+notes. Expression and folder ids are given out here, in the order the
+statements appear in the program.
+'''
+import copy
+
+import nodes
+from cache import ModuleCache, content_hash
+from emit import LatexBuffer
+
+EXPRESSION_TEMPLATE: dict = {
+    "type": "expression",
+    "id": 1,
+    "color": "#c74440",
+    "latex": "",
+    "lineStyle": "SOLID",
+    "lineOpacity": "1",
+    "lineWidth": "2.5",
+    "folderId": 0
+}
+FOLDER_TEMPLATE: dict = {
+    "type": "folder",
+    "id": 1,
+    "name": ""
+}
+NOTE_TEMPLATE: dict = {
+    "type": "text",
+    "id": 1,
+    "text": ""
+}
+
+# the seed desmos draws random() values from, unless another one is given
+DEFAULT_RANDOM_SEED: str = "038ada9396ae4919ad0383b8fe134eb0"
+
+# functions desmos writes as \operatorname{name}
+OPERATOR_NAMES: tuple[str, ...] = ("polygon", "rgb", "hsv")
+
+
+def subscriptify(text: str) -> str:
+    """
+    Converts text into a desmos variable name, the first letter followed by the rest as a subscript
+
+    Arguments:
+        text -- the name to convert
+
+    Returns:
+        the name as latex
+    """
+    if len(text) == 1:
+        return text
+    return f"{text[0]}_{{{text[1:]}}}"
+
+
+def random_seed(seed: str | None) -> str:
+    """
+    Returns the randomSeed of the graph state for a seed: the seed itself if it is
+    32 hex digits like desmos uses, otherwise a hash of it, or the default seed for None
+    """
+    if seed is None:
+        return DEFAULT_RANDOM_SEED
+    if len(seed) == 32 and all(char in "0123456789abcdef" for char in seed):
+        return seed
+    return content_hash(seed)
+
+
+def variable_name(name: nodes.Name) -> str:
+    """
+    Returns the name desmos knows a variable by: the name, prefixed with the scope it is used in
+
+    Arguments:
+        name -- the variable
+    """
+    return name.scope[-1] + name.name if name.scope else name.name
+
+
+def relocate_id(value, first_id: int, last_id: int, offset: int):
+    """
+    Moves an expression or folder id that was given out between first_id and last_id by offset.
+    Any other value is returned unchanged
+
+    Folder ids are stored as strings, so those stay strings
+    """
+    if isinstance(value, str):
+        if value.isdigit() and first_id <= int(value) <= last_id:
+            return str(int(value) + offset)
+    elif isinstance(value, int) and first_id <= value <= last_id:
+        return value + offset
+    return value
+
+
+class CodeGenerator:
+    """Turns a syntax tree into a desmos graph state
+
+    Arguments:
+        module_cache -- where to store the compiled expressions of imported modules
+        stable_ids -- name expressions after what they define and the namespaces they are in,
+            instead of numbering them, so an expression keeps its id when the program around it changes
+        seed -- the seed for desmos' random values, see random_seed()
+    """
+
+    def __init__(self, module_cache: ModuleCache | None = None, stable_ids: bool = False, seed: str | None = None):
+        self.module_cache = module_cache
+        self.stable_ids = stable_ids
+        self.seed: str = random_seed(seed)
+        self.path: list[str] = []  # the namespaces the statement being generated is in
+        self.ids: dict[str, int] = {}  # stable id -> how many expressions have asked for it
+        self.expressions: list[dict] = []
+        self.expression_id: int = 0
+        self.folder_id: int | str = 0
+        self.latex: LatexBuffer = LatexBuffer()
+        self.imported: set[int] = set()  # indexes of the expressions that came from imported modules
+        self.renderers = {
+            nodes.Literal: self.render_literal,
+            nodes.Name: self.render_name,
+            nodes.Member: self.render_member,
+            nodes.Negate: self.render_negate,
+            nodes.Index: self.render_index,
+            nodes.BinaryOp: self.render_binary_op,
+            nodes.Group: self.render_group,
+            nodes.Point: self.render_point,
+            nodes.List: self.render_list,
+            nodes.Comprehension: self.render_comprehension,
+            nodes.Call: self.render_call,
+            nodes.MacroCall: self.render_nothing,
+            nodes.Block: self.render_block,
+            nodes.Sequence: self.render_sequence,
+            nodes.If: self.render_if,
+            nodes.Function: self.render_function,
+            nodes.MacroDefinition: self.render_nothing,
+        }
+
+    def generate(self, program: nodes.Program) -> dict:
+        """
+        Generates the desmos graph state for a program
+
+        Returns:
+            the graph state, ready to be turned into JSON
+        """
+        for statement in program.statements:
+            self.statement(statement)
+        return {
+            "version": 11,
+            "randomSeed": self.seed,
+            "graph": {
+                "viewport": {
+                    "xmin": -10,
+                    "ymin": -7.595766129032258,
+                    "xmax": 10,
+                    "ymax": 7.595766129032258
+                }
+            },
+            "expressions": {
+                "list": self.expressions
+            },
+            "includeFunctionParametersInRandomSeed": True
+        }
+
+    # ====== statements ========
+
+    def statement(self, statement: nodes.Statement, new_expression: bool = True):
+        """
+        Generates the expressions for one statement
+
+        Arguments:
+            statement -- the statement
+            new_expression -- False for statements in a block, which write into the expression they are in
+        """
+        if new_expression:
+            expression = copy.deepcopy(EXPRESSION_TEMPLATE)
+            self.expressions.append(expression)
+            outer_latex = self.latex
+            self.latex = LatexBuffer()
+        self.expression_id += 1
+        if not self.stable_ids:
+            self.expressions[-1]["id"] = self.expression_id
+        elif new_expression:
+            self.expressions[-1]["id"] = self.stable_id(statement.body)
+        self.expressions[-1]["folderId"] = self.folder_id
+        self.statement_body(statement.body)
+        if new_expression:
+            # the latex is only joined once the whole statement has been written
+            expression["latex"] = self.latex.text()
+            self.latex = outer_latex
+
+    def statement_body(self, body: nodes.Node | None):
+        """Generates whatever a statement is made of"""
+        if isinstance(body, nodes.Namespace):
+            self.namespace(body)
+        elif isinstance(body, nodes.Import):
+            self.import_module(body)
+        elif isinstance(body, nodes.Note):
+            note = copy.deepcopy(NOTE_TEMPLATE)
+            if self.stable_ids:
+                note["id"] = self.expressions[-1]["id"] + "/note"
+            note["text"] += str(body.text)
+            self.expressions.append(note)
+        elif isinstance(body, nodes.Sequence):
+            for part in body.parts:
+                self.statement_body(part)
+        else:
+            self.render(body)
+
+    def namespace(self, namespace: nodes.Namespace):
+        """Replaces the statement's expression with a folder, followed by everything in the namespace"""
+        folder = copy.deepcopy(FOLDER_TEMPLATE)
+        folder["id"] = self.expressions[-1]["id"]
+        folder["title"] = namespace.name
+        self.expressions[-1] = folder
+        self.folder_id = str(folder["id"])
+        self.path.append(namespace.name)
+        for statement in namespace.statements:
+            self.statement(statement)
+        self.path.pop()
+
+    def stable_id(self, body: nodes.Node | None) -> str:
+        """
+        Returns the id of a statement's expression in stable id mode: the namespaces it is in,
+        then the name it defines, or its place among the statements there that don't define a name
+        """
+        if isinstance(body, nodes.BinaryOp) and body.operator == "=" and isinstance(body.left, nodes.Name):
+            name = body.left.name
+        elif isinstance(body, (nodes.Function, nodes.Namespace)):
+            name = body.name
+        elif isinstance(body, nodes.Import):
+            name = body.module
+        else:
+            name = "#"
+        key = "/".join(self.path + [name])
+        count = self.ids.get(key, 0) + 1
+        self.ids[key] = count
+        if name == "#" or count > 1:
+            # unnamed expressions, and names defined more than once, are told apart by their order
+            key += f"~{count}"
+        return key
+
+    def import_module(self, module: nodes.Import):
+        """
+        Generates an imported module in place of the import statement,
+        reusing its compiled expressions if the parser found them in the module cache
+        """
+        if module.artifact is not None:
+            self.reuse_artifact(module.artifact)
+            return
+        if module.namespace is None:
+            return  # the module wasn't found
+        first_index = len(self.expressions) - 1
+        first_id = self.expression_id
+        self.namespace(module.namespace)
+        self.imported.update(range(first_index, len(self.expressions)))
+        if self.module_cache is not None and module.key is not None:
+            self.module_cache.put_artifact(module.key, {
+                "expressions": self.expressions[first_index:],
+                "first_id": first_id,
+                "last_id": self.expression_id,
+                "folder_id": self.folder_id,
+                **module.exports,
+            })
+
+    def reuse_artifact(self, artifact: dict):
+        """
+        Copies a compiled module's expressions into the output,
+        with their ids moved into this graph's ids
+        """
+        first_id = artifact["first_id"]
+        last_id = artifact["last_id"]
+        offset = self.expression_id - first_id
+        expressions = []
+        for expression in artifact["expressions"]:
+            expression = copy.deepcopy(expression)
+            if "id" in expression:
+                expression["id"] = relocate_id(expression["id"], first_id, last_id, offset)
+            if "folderId" in expression:
+                expression["folderId"] = relocate_id(expression["folderId"], first_id, last_id, offset)
+            expressions.append(expression)
+        # the first expression is the namespace's folder, which takes the import statement's place
+        self.imported.update(range(len(self.expressions) - 1, len(self.expressions) - 1 + len(expressions)))
+        self.expressions[-1:] = expressions
+        self.expression_id = last_id + offset
+        self.folder_id = relocate_id(artifact["folder_id"], first_id, last_id, offset)
+
+    # ====== latex ========
+
+    def render(self, node: nodes.Node | None):
+        """Writes the latex for a node into the current expression"""
+        if node is not None:
+            self.renderers[type(node)](node)
+
+    def render_nothing(self, node: nodes.Node):
+        pass
+
+    def render_literal(self, node: nodes.Literal):
+        self.latex += str(node.value)
+
+    def render_name(self, node: nodes.Name):
+        self.latex += subscriptify(variable_name(node))
+
+    def render_member(self, node: nodes.Member):
+        self.render(node.expression)
+
+    def render_negate(self, node: nodes.Negate):
+        self.latex += "-"
+        self.render(node.operand)
+
+    def render_index(self, node: nodes.Index):
+        self.render(node.target)
+        self.render(node.index)
+
+    def render_binary_op(self, node: nodes.BinaryOp):
+        # long chains of operators are written without recursing, so they can't hit the recursion limit
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                self.latex += item
+            elif isinstance(item, nodes.BinaryOp):
+                stack.append(item.right)
+                stack.append("\\to " if item.operator == "->" else item.operator)
+                stack.append(item.left)
+            else:
+                self.render(item)
+
+    def render_group(self, node: nodes.Group):
+        self.latex += "\\left("
+        self.render(node.expression)
+        self.latex += "\\right)"
+
+    def render_point(self, node: nodes.Point):
+        self.latex += r"\left("
+        self.render(node.x)
+        self.latex += ","
+        self.render(node.y)
+        self.latex += r"\right)"
+
+    def render_list(self, node: nodes.List):
+        self.latex += r"\left["
+        for index, item in enumerate(node.items):
+            if index:
+                self.latex += ","
+            self.render(item)
+        self.latex += r"\right]"
+
+    def render_comprehension(self, node: nodes.Comprehension):
+        self.latex += node.expression
+        self.latex += r"\operatorname{for}"
+        self.latex += node.variable
+        self.latex += "="
+        self.render(node.values)
+
+    def render_call(self, node: nodes.Call):
+        if node.function in OPERATOR_NAMES:
+            self.latex += "\\operatorname{" + node.function + "}" + "\\left("
+        elif node.user_defined:
+            self.latex += subscriptify(node.function) + "\\left("
+        else:
+            self.latex += "\\" + node.function + "\\left("
+        for index, argument in enumerate(node.arguments):
+            if index:
+                self.latex += ","
+            self.render(argument)
+        self.latex += "\\right)"
+
+    def render_block(self, node: nodes.Block):
+        for statement in node.statements:
+            self.statement(statement, new_expression=False)
+
+    def render_sequence(self, node: nodes.Sequence):
+        for part in node.parts:
+            self.render(part)
+
+    def render_if(self, node: nodes.If):
+        self.latex += "\\left\\{"
+        for index, (condition, value) in enumerate(node.branches):
+            if index:
+                self.latex += ","
+            self.render(condition)
+            self.latex += ":"
+            self.render(value)
+        if node.otherwise is not None:
+            self.latex += ","
+            self.render(node.otherwise)
+        self.latex += "\\right\\}"
+
+    def render_function(self, node: nodes.Function):
+        self.latex += subscriptify(node.name)
+        self.latex += r"\left("
+        self.latex += ",".join(subscriptify(node.name + parameter) for parameter in node.parameters)
+        self.latex += r"\right)"
+        self.latex += "="
+        self.render(node.body)
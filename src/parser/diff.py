@@ -0,0 +1,99 @@
+'''
+Graph state patches for the Graphlang compiler
+
+`interpreter.py file.graphlang --diff state.json` compares the new graph
+with the one saved in state.json by the last compile, and copies only the
+expressions that were added, changed or removed, keyed by expression id.
+On large graphs this is a small fraction of the full state.
+
+Expressions are matched by id, so diffs are only useful with stable ids
+(see CodeGenerator), which --diff turns on.
+'''
+import copy
+import json
+
+from emit import write_state
+
+PATCH_FORMAT: str = "graphlang-patch"
+PATCH_VERSION: int = 1
+
+
+def expressions_by_id(state: dict) -> dict[str, dict]:
+    """Returns a graph state's expressions keyed by their id, as a string like JSON object keys"""
+    return {str(expression["id"]): expression for expression in state.get("expressions", {}).get("list", [])}
+
+
+def diff_states(old: dict | None, new: dict) -> dict:
+    """
+    Compares two graph states
+
+    Arguments:
+        old -- the previous graph state, or None if there wasn't one
+        new -- the new graph state
+
+    Returns:
+        the patch: the expressions that were added or changed, the ids that were removed,
+        the new order of the ids if it isn't the old order with those applied,
+        and any other part of the state that changed
+    """
+    old = old or {}
+    old_expressions = expressions_by_id(old)
+    new_expressions = expressions_by_id(new)
+    patch = {
+        "format": PATCH_FORMAT,
+        "version": PATCH_VERSION,
+        "added": {},
+        "changed": {},
+        "removed": [key for key in old_expressions if key not in new_expressions],
+    }
+    for key, expression in new_expressions.items():
+        if key not in old_expressions:
+            patch["added"][key] = expression
+        elif old_expressions[key] != expression:
+            patch["changed"][key] = expression
+    # added expressions go to the end, so the order is only sent when that isn't where they belong
+    kept = [key for key in old_expressions if key in new_expressions]
+    if kept + list(patch["added"]) != list(new_expressions):
+        patch["order"] = list(new_expressions)
+    state = {key: value for key, value in new.items() if key != "expressions" and old.get(key) != value}
+    if state:
+        patch["state"] = state
+    return patch
+
+
+def apply_patch(old: dict | None, patch: dict) -> dict:
+    """
+    Applies a patch made by diff_states to the state it was made from
+
+    Returns:
+        the new graph state
+    """
+    if patch.get("format") != PATCH_FORMAT:
+        raise ValueError("not a graphlang patch")
+    state = copy.deepcopy(old or {})
+    state.update(copy.deepcopy(patch.get("state", {})))
+    expressions = expressions_by_id(state)
+    for key in patch["removed"]:
+        del expressions[key]
+    for key, expression in patch["changed"].items():
+        expressions[key] = copy.deepcopy(expression)
+    for key, expression in patch["added"].items():
+        expressions[key] = copy.deepcopy(expression)
+    order = patch.get("order", list(expressions))
+    state["expressions"] = {"list": [expressions[key] for key in order]}
+    return state
+
+
+def load_state(path: str) -> dict | None:
+    """Returns the graph state saved at path, or None if there isn't one yet"""
+    try:
+        with open(path, "rt", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def save_state(path: str, state: dict):
+    """Saves a graph state, for the next compile to be compared with"""
+    with open(path, "wt", encoding="utf-8") as file:
+        write_state(state, file)
@@ -0,0 +1,77 @@
+'''
+Output for the Graphlang compiler
+
+An expression's LaTeX is built up from many small pieces by the code
+generator. Adding to a string copies everything written so far, so the
+pieces are kept in a list and only joined once, when the statement is
+finished.
+
+The finished graph state is written out one expression at a time, so a
+large graph is never held in memory as one JSON string as well as a dict.
+Copying it to the clipboard is optional, and needs pyperclip.
+'''
+import json
+
+
+class LatexBuffer:
+    """The LaTeX of the expression being generated, as a list of fragments"""
+    __slots__ = ("fragments",)
+
+    def __init__(self):
+        self.fragments: list[str] = []
+
+    def __iadd__(self, text: str) -> "LatexBuffer":
+        self.append(text)
+        return self
+
+    def append(self, text: str) -> None:
+        """Adds text to the end of the expression"""
+        if text:
+            self.fragments.append(text)
+
+    def text(self) -> str:
+        """Returns the LaTeX written so far"""
+        return "".join(self.fragments)
+
+
+def write_state(state: dict, file) -> None:
+    """
+    Writes a graph state as JSON, the same as json.dump would, but one expression at a time
+
+    Arguments:
+        state -- the graph state, or a patch from diff.py
+        file -- a text file to write to, like sys.stdout
+    """
+    file.write("{")
+    for index, (key, value) in enumerate(state.items()):
+        if index:
+            file.write(", ")
+        file.write(json.dumps(key) + ": ")
+        if key == "expressions" and list(value) == ["list"]:
+            file.write('{"list": [')
+            for position, expression in enumerate(value["list"]):
+                if position:
+                    file.write(", ")
+                file.write(json.dumps(expression))
+            file.write("]}")
+        else:
+            file.write(json.dumps(value))
+    file.write("}")
+
+
+def copy_to_clipboard(state: dict) -> bool:
+    """
+    Copies a graph state to the clipboard as JSON
+
+    Returns:
+        False if there is no clipboard to copy to: pyperclip isn't installed, or can't find one
+    """
+    try:
+        import pyperclip
+    except ImportError:
+        return False
+    try:
+        pyperclip.copy(json.dumps(state))
+    except pyperclip.PyperclipException:
+        return False
+    return True
@@ -0,0 +1,217 @@
+'''
+Import resolution for the Graphlang compiler
+
+Before a program is parsed, every `import name` in it (and in the modules it
+imports) is resolved to a file, giving the program's dependency graph.
+Each module is read and lexed at most once per compilation, and import
+cycles are found before any code is emitted.
+'''
+import glob
+import os
+
+from cache import ModuleCache
+from tokens import SourceFile, TokenStream, KEYWORD, IDENTIFIER
+
+STDLIB_DIR: str = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "stdlib"))
+
+
+class ImportCycleError(Exception):
+    """Raised when modules import each other in a loop
+
+    Arguments:
+        cycle -- the module names in the loop, starting and ending with the same module
+        source -- the file containing the import that closes the loop
+        line_nr -- the line of that import
+    """
+
+    def __init__(self, cycle: list[str], source: SourceFile | None, line_nr: int):
+        self.cycle = cycle
+        self.source = source
+        self.line_nr = line_nr
+        super().__init__("Import cycle: " + " -> ".join(cycle))
+
+
+def find_imports(stream: TokenStream) -> list[tuple[str, int]]:
+    """
+    Finds every import statement in a token stream
+
+    Returns:
+        (module name, index of the import keyword) for each import, in order
+    """
+    kinds = stream.kinds
+    values = stream.values
+    imports = []
+    for index in range(len(kinds) - 1):
+        if kinds[index] == KEYWORD and values[index] == "import" and kinds[index + 1] == IDENTIFIER:
+            imports.append((values[index + 1], index))
+    return imports
+
+
+class ImportGraph:
+    """The modules a program imports
+
+    Nodes are file paths (the program itself is stored under its file name),
+    edges are the `import name` statements in each file.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        # path -> [(module name, resolved path or None)]
+        self.edges: dict[str, list[tuple[str, str | None]]] = {root: []}
+
+    def modules(self) -> list[str]:
+        """Returns the path of every module the program imports, dependencies first"""
+        order = []
+        visited = set()
+
+        def visit(node):
+            for _, path in self.edges.get(node, []):
+                if path is not None and path not in visited:
+                    visited.add(path)
+                    visit(path)
+                    order.append(path)
+
+        visit(self.root)
+        return order
+
+    def format(self, symbols: dict[str, tuple[str, ...]] | None = None) -> str:
+        """
+        Draws the graph as an indented tree
+
+        Arguments:
+            symbols -- the top level names of each module, to list how many each one defines
+        """
+        lines = [self.root]
+        shown = set()
+
+        def draw(node, depth):
+            for name, path in self.edges.get(node, []):
+                indent = "    " * depth
+                if path is None:
+                    lines.append(f"{indent}- {name} (not found)")
+                    continue
+                line = f"{indent}- {name} ({path})"
+                if symbols is not None and path in symbols:
+                    count = len(symbols[path])
+                    line += f", {count} name{'' if count == 1 else 's'}"
+                if path in shown:
+                    lines.append(line + ", already imported")
+                    continue
+                shown.add(path)
+                lines.append(line)
+                draw(path, depth + 1)
+
+        draw(self.root, 1)
+        return "\n".join(lines)
+
+
+class ImportResolver:
+    """Finds, reads and lexes imported modules, once each
+
+    Arguments:
+        module_cache -- cache of lexed modules
+        search_paths -- directories to look for `name.graphlang` in, in order
+    """
+
+    def __init__(self, module_cache: ModuleCache, search_paths: list[str] | None = None):
+        self.module_cache = module_cache
+        self.search_paths = search_paths if search_paths is not None else [os.curdir, STDLIB_DIR]
+        self.paths: dict[str, str | None] = {}
+        # path -> (text, tokens, top level symbols)
+        self.modules: dict[str, tuple[str, TokenStream, tuple[str, ...]]] = {}
+
+    def find(self, module_name: str) -> str | None:
+        """Returns the path of a module, or None if it can't be found"""
+        if module_name not in self.paths:
+            self.paths[module_name] = None
+            for directory in self.search_paths:
+                path = os.path.normpath(os.path.join(directory, module_name + ".graphlang"))
+                if os.path.isfile(path):
+                    self.paths[module_name] = path
+                    break
+        return self.paths[module_name]
+
+    def load(self, path: str, lex) -> tuple[str, TokenStream, tuple[str, ...]]:
+        """
+        Reads and lexes a module, using the module cache
+
+        Arguments:
+            path -- the path of the module
+            lex -- function used to lex the module on a cache miss, taking (code, source)
+
+        Returns:
+            (text, tokens, top level symbols)
+        """
+        if path not in self.modules:
+            with open(path, "r", encoding="utf-8") as module:
+                text = module.read()
+            cached = self.module_cache.get(path, text)
+            if cached is None:
+                stream = lex(text, SourceFile(path, text))
+                symbols = self.module_cache.put(path, text, stream)
+            else:
+                stream, symbols = cached
+            self.modules[path] = (text, stream, symbols)
+        return self.modules[path]
+
+    def build(self, root: str, stream: TokenStream, lex) -> ImportGraph:
+        """
+        Resolves every import reachable from a program
+
+        Arguments:
+            root -- the name of the program's file
+            stream -- the program's tokens
+            lex -- function used to lex modules, taking (code, source)
+
+        Raises:
+            ImportCycleError: if modules import each other in a loop
+        """
+        root = os.path.normpath(root)
+        graph = ImportGraph(root)
+        stack = [root]
+
+        def visit(node, tokens):
+            for module_name, index in find_imports(tokens):
+                path = self.find(module_name)
+                graph.edges[node].append((module_name, path))
+                if path is None:
+                    continue
+                if path in stack:
+                    cycle = [self.name_of(item, graph) for item in stack[stack.index(path):]]
+                    raise ImportCycleError(cycle + [module_name], tokens.source, tokens.lines[index])
+                if path in graph.edges:
+                    continue
+                graph.edges[path] = []
+                stack.append(path)
+                visit(path, self.load(path, lex)[1])
+                stack.pop()
+
+        visit(root, stream)
+        return graph
+
+    def name_of(self, path: str, graph: ImportGraph) -> str:
+        """Returns the name a path was imported as (or the root's file name)"""
+        if path == graph.root:
+            return path
+        for name, found in self.paths.items():
+            if found == path:
+                return name
+        return path
+
+
+def warm_cache(module_cache: ModuleCache) -> int:
+    """
+    Lexes every standard library module into the module cache,
+    for compilers that will share the cache to find there
+
+    Returns:
+        how many modules there are
+    """
+    resolver = ImportResolver(module_cache)
+    modules = glob.glob(os.path.join(STDLIB_DIR, "*.graphlang"))
+    for path in modules:
+        try:
+            resolver.load(path, TokenStream.from_code)
+        except Exception:
+            pass  # the module's error is reported by whichever file imports it
+    return len(modules)
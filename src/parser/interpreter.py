@@ -3,45 +3,124 @@ Interpreter for the Graphlang programming language
 
 '''
 #!/usr/bin/env python3
-import pprint
-import re
-import json
+import contextlib
 import sys
 import time
 import os
 import copy
+import argparse
 from Utils import colors
-import pyperclip
+import lexer
+from cache import ModuleCache, content_hash
+from imports import ImportResolver, ImportCycleError
+from macros import MacroTemplate
+from symbols import SymbolTable
+from codegen import CodeGenerator
+from emit import write_state, copy_to_clipboard
+import nodes
+from tokens import SourceFile, TokenStream, TokenSource, KEYWORD, IDENTIFIER, LITERAL, PUNCTUATION, NOTE, LINE
 
 
 class Error(BaseException):
     """Class for Graphlang Errors
 
+    The traceback text is only built when the error is printed,
+    from the file and line of the token that caused it.
+
     Arguments:
         BaseException -- _description_
     """
 
-    def __init__(self, message: str, lines: list, line_nr: int):
+    def __init__(self, message: str, source: SourceFile | None, line_nr: int):
         """
         Raise an error with the given message, including the line number and code above it
 
         Arguments:
-            message -- _description_
-            lines -- _description_
-            line_nr -- _description_
+            message -- the error message
+            source -- the file the error is in
+            line_nr -- the line the error is on
         """
         self.message = "Syntax Error: " + message
+        self.source = source
         self.line_number = line_nr
-        self.new_message = f'''
+        super().__init__(message)
+
+    def __str__(self) -> str:
+        name = self.source.name if self.source is not None else "<unknown>"
+        line = self.source.line(self.line_number) if self.source is not None else ""
+        new_message = f'''
 Traceback (most recent call last):
-File {colors.BLUE}"<{sys.argv[1]}>"{colors.END}, line {colors.BLUE}{self.line_number}{colors.END}, in {colors.BLUE}<module>{colors.END}:
-    {lines[self.line_number - 1]}
+File {colors.BLUE}"{name}"{colors.END}, line {colors.BLUE}{self.line_number}{colors.END}, in {colors.BLUE}<module>{colors.END}:
+    {line}
     ^'''
-        for _ in range(len(lines[self.line_number-1])):
-            self.new_message += "^"
-        self.new_message += f"\nSyntax Error: {
-            colors.RED}{message}{colors.END}"
-        super().__init__(self.new_message)
+        new_message += "^" * len(line)
+        new_message += f"\nSyntax Error: {colors.RED}{self.args[0]}{colors.END}"
+        return new_message
+
+
+class CompileError(Exception):
+    """Raised by compile() when a program doesn't compile
+
+    Arguments:
+        message -- what went wrong
+        filename -- the file the error is in
+        line -- the line the error is on
+    """
+
+    def __init__(self, message: str, filename: str | None, line: int):
+        self.message = message
+        self.filename = filename
+        self.line = line
+        super().__init__(f"{filename}:{line}: {message}")
+
+
+def memoized(parse):
+    """
+    Decorator for parse_* methods that remembers what they parsed at each token position,
+    so backtracking over the same tokens doesn't parse them again (packrat parsing).
+
+    A result is only remembered if parsing it didn't change anything but the position:
+    no tokens were spliced in, no names were defined and the scope is the same.
+    """
+    rule = parse.__name__
+
+    def wrapper(self):
+        chunk, index, _ = self.tokens.mark()
+        key = (rule, chunk, index, tuple(self.scope_path))
+        state = (self.tokens.version, self.effects)
+        entry = self.memo.get(key)
+        if entry is not None and entry[0] == state:
+            _, result, end, unterminated, error = entry
+            if error is not None:
+                raise error
+            self.reset_position(end)
+            self.unterminated = unterminated
+            return result
+        try:
+            result = parse(self)
+        except Error as error:
+            if (self.tokens.version, self.effects) == state and tuple(self.scope_path) == key[3]:
+                self.memo[key] = (state, None, None, None, error)
+            raise
+        if (self.tokens.version, self.effects) == state and tuple(self.scope_path) == key[3]:
+            self.memo[key] = (state, result, self.tokens.mark(), self.unterminated, None)
+        return result
+
+    return wrapper
+
+
+# how tightly each operator binds, higher binds tighter
+PRECEDENCE: dict[str, int] = {
+    "=": 1,
+    "->": 2,
+    "<": 3, ">": 3, "<=": 3, ">=": 3,
+    "+": 4, "-": 4,
+    "*": 5, "/": 5,
+    "negate": 6,
+    "^": 7,
+}
+RIGHT_ASSOCIATIVE: tuple[str, ...] = ("=", "^")
+NEGATE: str = "negate"  # a - in front of a value
 
 
 class GraphLangInterpreter:
@@ -49,94 +128,59 @@ class GraphLangInterpreter:
         Not really sure what else to write in this docstring :(
     """
 
-    def __init__(self, code, debug=False):
+    def __init__(self, code, debug=False, filename="<string>", module_cache=None, optimise=0,
+                 cse_min_size=3, cse_min_count=2, wakascopes=False, stable_ids=False, import_paths=None,
+                 random_seed=None, result_cache=None):
         self.debug = debug
+        self.stable_ids: bool = stable_ids  # see CodeGenerator
+        self.random_seed: str | None = random_seed  # see codegen.random_seed
+        self.result_cache = result_cache  # a results.ResultCache to reuse the graphs of programs compiled before
+        self.cached: bool = False  # True if the graph came from the result cache
+        self.optimise: int = optimise  # the -O level
+        # repeated calculations are hoisted at -O2 if they are at least this large, and appear this often
+        self.cse_min_size: int = cse_min_size
+        self.cse_min_count: int = cse_min_count
+        self.wakascopes: bool = bool(wakascopes)  # rewrite functions that repeat a calculation into wakascopes
+        # what the optimisation passes did, once they have run
+        self.folded: int = 0  # operations worked out at compile time
+        self.inlined: int = 0  # namespace constants replaced with their value
+        self.hoisted: int = 0  # helper variables added for repeated calculations
+        self.removed: int = 0  # unused expressions of imported modules left out of the output
+        self.transformed: list[str] = []  # functions rewritten into wakascopes
+        self.reparsed: int = 0  # statements parse_incremental had to parse
+        self.warnings: list[str] = []  # problems that didn't stop the program compiling
+        self.module_cache: ModuleCache = module_cache if module_cache is not None else ModuleCache()
         self.code: str = code
-        self.tokens: list = []
-        self.vars: dict[list] = {
-            'hsv': None,
-            'rgb': None,
-            'sin': None,
-            'cos': None,
-            'tan': None,
-            'csc': None,
-            'sec': None,
-            'cot': None,
-            'arcsin': None,
-            'arcos': None,
-            'arctangent': None,
-            'arccosecant': None,
-            'arcsecant': None,
-            'arccotangent': None,
-            'mean': None,
-            'median': None,
-            'min': None,
-            'max': None,
-            'quartile': None,
-            'quantile': None,
-            'stdev': None,
-            'stdevp': None,
-            'varp': None,
-            'mad': None,
-            'cov': None,
-            'covp': None,
-            'corr': None,
-            'spearman': None,
-            'stats': None,
-            'count': None,
-            'total': None,
-            'join': None,
-            'sort': None,
-            'shuffle': None,
-            'unique': None,
-            'histogram': None,
-            'dotplot': None,
-            'boxplot': None,
-            'random': None,
-            'exp': None,
-            'ln': None,
-            'log': None,
-            'int': None,
-            'sum': None,
-            'prod': None,
-            'tone': None,
-            'lcm': None,
-            'sqrt': None,
-            'polygon': None,
-            "X": None,
-            "Y": None,
-            "x": None,
-            "y": None
-        }
-        self.line_nr: int = 0
+        self.source: SourceFile = SourceFile(filename, code)
+        self.tokens: TokenSource = TokenSource(TokenStream())
+        self.symbols: SymbolTable = SymbolTable([
+            "hsv", "rgb", "sin", "cos", "tan", "csc", "sec", "cot", "arcsin", "arcos",
+            "arctangent", "arccosecant", "arcsecant", "arccotangent", "mean", "median", "min",
+            "max", "quartile", "quantile", "stdev", "stdevp", "varp", "mad", "cov", "covp", "corr",
+            "spearman", "stats", "count", "total", "join", "sort", "shuffle", "unique",
+            "histogram", "dotplot", "boxplot", "random", "exp", "ln", "log", "int", "sum", "prod",
+            "tone", "lcm", "sqrt", "polygon", "X", "Y", "x", "y"
+        ])
         self.output: dict = {}
-        self.expression_id: int = 0
-        self.folder_id: int = 0
-        self.token_patterns: list[tuple[str, str]] = [
-            ("keyword", r"\b(fn|ns|if|else|for|macro|import)\b"),
-            ("identifier", r"[A-Za-z_][A-Za-z0-9_]*"),
-            ("literal", r"\d+"),
-            ("punctuation", r"[\{\}\[\]\(\)\.\,\;\!]"),
-            ("operator", r"->|\+|-|\*|/|>|<|>=|<=|!=|=|\^"),
-            ("skip", r"[ \t]+"),
-            ("note", r"\".*?\"|'.*?'"),
-            ("comment", r"#.*"),
-            ("line", r"\n")
-        ]
-        self.position: int = 0
-        self.tokens: list[tuple[str, str]] = self.lex(self.code)
-        self.position: int = 0
-        self.lines: list[str] = self.code.splitlines()
+        stream: TokenStream = self.lex(self.code, self.source)
         try:
-            self.current_token: tuple = self.tokens[0]
+            self.current_token: tuple = stream[0]
         except IndexError:
             self.current_token: None = None
 
-        self.expression_template = None
-        self.note_template = None
-        self.folder_template = None
-        self.location: int = 0
-        self.tokens.append(("line", "\n"))  # append an item to fix parsing
+        self.program: nodes.Program = nodes.Program()
+        self.block: list[nodes.Statement] = self.program.statements  # where statements are parsed into
+        self.statement_start = None  # position of the first token of the statement being parsed
+        self.unterminated = None  # the last expression parse_expression couldn't find the end of
+        # (rule, position, scope) -> what was parsed there, see memoized()
+        self.memo: dict[tuple, tuple] = {}
+        self.effects: int = 0  # number of names defined so far
+        stream.append(LINE, "\n", len(self.code), self.code.count("\n") + 1)  # append an item to fix parsing
+        self.tokens: TokenSource = TokenSource(stream)
+        self.stream: TokenStream = stream
+        self.imports: ImportResolver = ImportResolver(self.module_cache, import_paths)
+        self.import_graph = None
+        self.imported: dict[str, tuple[str, ...]] = {}  # path of each module imported so far -> its namespace
         self.builtins: list[str] = ["hsv", "rgb",  # colors
                                     "sin", "cos", "tan",  # trigonometry
                                     "csc", "sec", "cot",  # 1/trig
@@ -155,54 +199,43 @@ class GraphLangInterpreter:
                                     "tone",  # tone
                                     "lcm", "sqrt", "polygon"]  # random stuff
         self.functions: list = []
-        self.macros: list[dict[str:str, str:str]] = []  # user-defined macros
+        self.macros: dict[str, MacroTemplate] = {}  # user-defined macros
         self.special: dict[str, str] = {"__name__": ""}  # special variables
         self.scope_path: list[str] = []
     # lexer
 
-    def lex(self, code: str):
+    def lex(self, code: str, source: SourceFile):
         """
-        Lexes the code and adds tokens to self.tokens.
+        Lexes the code into a token stream, using the precompiled pattern in lexer.py
+
+        Arguments:
+            code -- the code to lex
+            source -- the file the code came from, for error messages
 
         Returns
         -------
         Tokens
         """
-        starting_position: int = copy.deepcopy(self.position)
-        self.position = 0
-        tokens = []
-        token_regex = '|'.join(
-            f'(?P<{pair[0]}>{pair[1]})' for pair in self.token_patterns)
-        matcher = re.compile(token_regex).match(code)
-        while matcher is not None:
-            token_type = matcher.lastgroup
-            value = matcher.group(token_type)
-            if token_type == "literal":
-                value = int(value)
-                tokens.append((token_type, value))
-            elif token_type in ["skip", "comment"]:
-                pass
-            else:
-                tokens.append((token_type, value))
-            self.position = matcher.end()
-            matcher = re.compile(token_regex).match(code, self.position)
-        # if we have stopped before the end of the code
         try:
-            if self.position != len(code):
-                self.raise_error(
-                    f"Unknown character: {code[self.position]} at {self.line_nr}: {self.position}"  # nopep8
-                )  # nopep8
-        except AttributeError:
-            pass
-        self.position = starting_position
-        return tokens
+            return TokenStream.from_code(code, source)
+        except lexer.LexError as error:
+            raise Error(str(error), source, error.line) from None
 
     # ======= Utility functions =======
     # functions that are used to navigate the token list,
     # control the stack, and raise errors
 
-    def run(self):
-        """Run the interpreter, lexing, parsing, evaluating, and copying output to the clipboard."""
+    def run(self, state_file: str | None = None, out=None, clipboard: bool = True, interactive: bool = True):
+        """
+        Run the interpreter, lexing, parsing, evaluating, and copying output to the clipboard.
+
+        Arguments:
+            state_file -- if given, output only the changes since the graph saved in this file,
+                and save the new graph there (see diff.py)
+            out -- a text file to write the graph to, one expression at a time
+            clipboard -- copy the graph to the clipboard, if there is one
+            interactive -- wait for a key press after printing an error, so the console window stays open
+        """
         # setup exception handling hook
 
         def custom_excepthook(exc_type, exc_value, exc_traceback):
@@ -210,68 +243,85 @@ class GraphLangInterpreter:
                 print(f"{exc_value}")
                 if self.debug:
                     print(f'{colors.PURPLE} Debug Info: {colors.END}')
-                    pprint.pprint(self.vars)  # nopep8{self.vars}
+                    import pprint  # only needed here, and slow to import
+                    pprint.pprint(self.symbols.nested())
 
-                os.system("pause")
+                if interactive:
+                    os.system("pause")
             else:
                 # For other exceptions, you can still display the full traceback if needed.
                 sys.__excepthook__(exc_type, exc_value, exc_traceback)
 
         sys.excepthook = custom_excepthook
 
-        if len(self.tokens) == 0:
+        if self.current_token is None:
             pass
         else:
-            self.line_nr += 1
             self.parse_program()
-
-            data = json.dumps(self.output)
-            pyperclip.copy(data)
-            print("Copied: ", data)
-            print(self.macros)
+            for warning in self.warnings:
+                print(colors.YELLOW + "Warning: " + warning + colors.END)
+            if self.cached:
+                print(colors.BLUE + "Compiled before, reused the graph from the result cache" + colors.END)
+
+            if state_file is None:
+                result = self.output
+                description = f"{len(self.output['expressions']['list'])} expressions"
+            else:
+                import diff  # only needed with --diff
+                result = diff.diff_states(diff.load_state(state_file), self.output)
+                diff.save_state(state_file, self.output)
+                description = (f"patch: {len(result['added'])} added, {len(result['changed'])} changed, "
+                               f"{len(result['removed'])} removed expressions")
+            if out is not None:
+                write_state(result, out)
+                out.flush()
+            if clipboard:
+                if copy_to_clipboard(result):
+                    print(colors.GREEN + "Copied " + description + colors.END)
+                else:
+                    print(colors.YELLOW + "Couldn't copy to the clipboard, use --out or --stdout instead" + colors.END)
+            elif out is not None:
+                print(colors.GREEN + "Wrote " + description + colors.END)
+            if self.optimise:
+                print(colors.BLUE + f"-O{self.optimise}: folded {self.folded} operations, "
+                      f"inlined {self.inlined} constants, "
+                      f"hoisted {self.hoisted} repeated calculations, "
+                      f"removed {self.removed} unused expressions" + colors.END)
+            if self.wakascopes:
+                print(colors.BLUE + f"Wakascopes: rewrote {len(self.transformed)} functions" + colors.END)
+                for function in self.transformed:
+                    print(colors.BLUE + "    fn " + function + colors.END)
 
     def raise_error(self, message):
         """
-        Raise an error with the given message, including the line number and code above it
+        Raise an error with the given message, at the file and line of the current token
 
         :param message: The error message to be displayed
         :type message: str
         """
-        raise Error(message, self.lines, self.line_nr)
+        raise Error(message, *self.tokens.location())
 
     # get the next token
 
     def next_token(self):
         """
-        Get the next token from the token list, 
-        incrementing the line number if the current token is a newline.
+        Get the next token from the token list.
         If the end of the list is reached, set the current token to None.
         """
-        try:
-            if self.current_token[0] == "line":
-                self.line_nr += 1
-            self.current_token = self.tokens[self.position + 1]
-            self.position += 1
-            # print(self.current_token)
-        except IndexError:
-            self.current_token = None
+        if self.current_token is None:
+            raise TypeError("no more tokens")
+        self.current_token = self.tokens.advance()
 
     def previous_token(self):
         """
-        Get the next token from the token list, 
-        incrementing the line number if the current token is a newline.
-        If the end of the list is reached, set the current token to None.
+        Get the previous token from the token list.
+        If the start of the list is reached, set the current token to None.
         """
-        try:
-            if self.current_token[0] == "line":
-                self.line_nr -= 1
-            self.current_token = self.tokens[self.position - 1]
-            self.position -= 1
-            # print(self.current_token)
-        except IndexError:
-            self.current_token = None
+        if self.current_token is None:
+            raise TypeError("no more tokens")
+        self.current_token = self.tokens.retreat()
 
-    def peek_token(self, num: int) -> tuple[str, str] | None:
+    def peek_token(self, num: int) -> tuple[int, str] | None:
         """looks ahead at the next token
 
         Arguments:
@@ -280,63 +330,20 @@ class GraphLangInterpreter:
         Returns:
             token
         """
-        try:
-            return self.tokens[self.position + num]
-        except IndexError:
-            return None
-
-    def skip_lines(self) -> None:
-        while self.current_token[0] == "line":
-            self.next_token()
-
-    def subscriptify(self, text):
-        """
-        This function converts the given text into a subscript format 
-        if the text length is greater than 1.
+        return self.tokens.peek(num)
 
-        Parameters:
-            text (str): The input text to be converted into subscript format.
-
-        Returns:
-            str: The text converted into subscript format.
-        """
-        if len(list(text)) == 1:
-            return text
-        return f"{text[0]}_{{{text[1:]}}}"
-
-    def get_variables(self, scope_path):
-        # scope path is a list of scope to get to the variable we want
-        """
-        Retrieves a variable from the given scope path.
-
-        Parameters:
-            scope_path (list): The list of scopes to get to the variable.
-
-        Returns:
-            dict: The variable's dictionary.
-        """
-
-        variables = copy.deepcopy(self.vars)
-        for scope in scope_path:
-            variables = copy.deepcopy(variables[scope])
-        return variables
-
-    def set_variables(self, scope_path):
-        # scope path is a list of scope to get to the variable we want
-        """
-        Retrieves a variable from the given scope path and can edit it
+    def reset_position(self, mark) -> None:
+        """moves back to a position saved with self.tokens.mark()
 
-        Parameters:
-            scope_path (list): The list of scopes to get to the variable.
-
-        Returns:
-            dict: The variable's dictionary.
+        Arguments:
+            mark -- the saved position
         """
+        self.tokens.reset(mark)
+        self.current_token = self.tokens.current()
 
-        variables = self.vars
-        for scope in scope_path:
-            variables = variables[scope]
-        return variables
+    def skip_lines(self) -> None:
+        while self.current_token[0] == LINE:
+            self.next_token()
 
     def add_variable(self, scope_path, name, value):
         """
@@ -350,13 +357,9 @@ class GraphLangInterpreter:
         :type value: Any
         """
 
-        current_scope = self.vars
-        for scope in scope_path:
-            if scope not in current_scope:
-                current_scope[scope] = {}
-            current_scope = current_scope[scope]
-
-        current_scope[name] = value
+        self.effects += 1
+        # only dicts (namespaces, functions and macros) can have names defined in them
+        self.symbols.define(tuple(scope_path), name, isinstance(value, dict))
 
     def check_variable(self, scope_path: str, name):
         """
@@ -374,19 +377,11 @@ class GraphLangInterpreter:
         Returns:
             bool: True if the variable exists, False if it does not.
         """
-        if name in self.vars:
-            if self.tokens[self.position+1][1] == ".":
+        if (name,) in self.symbols:
+            if self.peek_token(1)[1] == ".":
                 self.scope_path.append(name)
             return True
-
-        checking = []
-        current_scope = self.vars
-        for scope in scope_path:
-            if scope not in current_scope:
-                return False
-            current_scope = current_scope[scope]
-            checking.append(name in current_scope)
-        return any(checking)
+        return self.symbols.is_visible(tuple(scope_path), name)
 
     def end_safely(func):
         '''
@@ -404,31 +399,112 @@ class GraphLangInterpreter:
 
         return wrapper
 
+    def artifact_key(self, path: str, text: str, module_name: str) -> tuple:
+        """
+        Everything the compiled output of an import depends on
+
+        Arguments:
+            path -- the path of the module
+            text -- the contents of the module
+            module_name -- the name it is imported as
+
+        Returns:
+            the key for the module's artifact in the module cache
+        """
+        return (os.path.abspath(path), content_hash(text), module_name, tuple(self.scope_path),
+                self.optimise, self.cse_min_size, self.cse_min_count, self.wakascopes,
+                self.stable_ids, tuple(self.functions),
+                tuple(macro.key() for macro in self.macros.values()), tuple(sorted(self.special.items())),
+                tuple(sorted(self.imported)))
+
+    def apply_artifact(self, artifact: dict, module_name: str):
+        """
+        Reuses a compiled module instead of parsing it again.
+        The names it defined are added to the scope, and its expressions are copied
+        into the output by the code generator
+
+        Arguments:
+            artifact -- the compiled module from the module cache
+            module_name -- the name it is imported as
+        """
+        if artifact["variables"] is not None:
+            self.symbols.import_scope(tuple(self.scope_path), module_name, artifact["variables"])
+        self.functions.extend(artifact["functions"])
+        for data in artifact["macros"]:
+            macro = MacroTemplate.from_data(data)
+            self.macros[macro.name] = macro
+        self.special.update(artifact["special"])
+        for path, scope in artifact["imported"]:
+            self.imported[path] = tuple(self.scope_path) + (module_name,) + tuple(scope)
+        return nodes.Import(module_name, artifact=artifact)
+
     def open_import(self, path, module_name):
-        with open(path, "r", encoding="utf-8") as module:
-            self.next_token()  # skip import
-            self.next_token()  # skip name
-            self.next_token()  # move onto next token
-            imported = module.read()
-            tokens_to_insert = [
-                ("keyword", "ns"),
-                ("identifier", module_name),
-                ("punctuation", "{"),
-                ("line", "\n")
-            ] + self.lex(imported) + [
-                ("line", "\n"),
-                ("punctuation", "}")
-            ]
-
-            # Reverse the list for the insertion order
-            tokens_to_insert = list(reversed(tokens_to_insert))
-
-# Insert each token at the specified position
-            for token in tokens_to_insert:
-                self.tokens.insert(self.position + 1, token)
-
-            self.code = ' '.join([str(token[1]) for token in self.tokens])
-            self.lines = self.code.splitlines()
+        """
+        Parses an imported module as a namespace called module_name, in place of the import statement.
+        If the module has been compiled the same way before, its compiled expressions are reused
+
+        Arguments:
+            path -- the path of the module
+            module_name -- the name it is imported as
+
+        Returns:
+            the Import node
+        """
+        imported, module_tokens, _ = self.imports.load(path, self.lex)
+        key = self.artifact_key(path, imported, module_name)
+        artifact = self.module_cache.get_artifact(key)
+        if artifact is not None:
+            return self.apply_artifact(artifact, module_name)
+        # the wrapping namespace is blamed on the import statement
+        source, line_nr = self.tokens.location()
+        tokens_to_insert = [
+            TokenStream.from_tokens([
+                (KEYWORD, "ns"),
+                (IDENTIFIER, module_name),
+                (PUNCTUATION, "{"),
+                (LINE, "\n")
+            ], source, line_nr),
+            module_tokens,
+            TokenStream.from_tokens([
+                (LINE, "\n"),
+                (PUNCTUATION, "}")
+            ], source, line_nr)
+        ]
+
+        # splice the module in straight after `import name`, and parse it as a namespace
+        self.tokens.splice(*tokens_to_insert)
+        self.next_token()
+        functions = len(self.functions)
+        macros = dict(self.macros)
+        imported = dict(self.imported)
+        namespace = self.parse_namespace()
+        # the code generator stores these with the module's compiled expressions
+        exports = {
+            "variables": self.symbols.export(tuple(self.scope_path) + (module_name,)),
+            "functions": self.functions[functions:],
+            "macros": [macro.to_data() for name, macro in self.macros.items() if macros.get(name) is not macro],
+            "special": dict(self.special),
+            # modules it imported, which aren't imported again, with their namespaces inside it
+            "imported": sorted((path, scope[len(self.scope_path) + 1:])
+                               for path, scope in self.imported.items() if path not in imported),
+        }
+        return nodes.Import(module_name, namespace, key=key, exports=exports)
+
+    def resolve_imports(self):
+        """
+        Finds every module the program imports, directly or through other modules,
+        before anything is parsed
+
+        Returns:
+            the program's ImportGraph
+        """
+        if self.import_graph is None:
+            try:
+                self.import_graph = self.imports.build(self.source.name, self.stream, self.lex)
+            except ImportCycleError as error:
+                raise Error(str(error), error.source, error.line_nr) from None
+        return self.import_graph
+
     # ====== Parsing statements ========
     # functions for checking that each token conforms with the grammar
     # each function returns true or false
@@ -444,67 +520,206 @@ class GraphLangInterpreter:
         it and move on to the next token. This is done until the current token is
         None.
 
-        At the start of the function, the output dictionary is initialized with
-        the required fields for Graphing Calculator.
+        The statements are parsed into a syntax tree (self.program), which is then
+        turned into the desmos graph state (self.output) by the code generator.
 
         :return: None
         """
-        self.expression_template = {
-            "type": "expression",
-            "id": 1,
-            "color": "#c74440",
-            "latex": "",
-            "lineStyle": "SOLID",
-            "lineOpacity": "1",
-            "lineWidth": "2.5",
-            "folderId": 0
-        }
-        self.folder_template = {
-            "type": "folder",
-            "id": 1,
-            "name": ""
-        }
-        self.note_template = {
-            "type": "text",
-            "id": 1,
-            "text": ""
-        }
-
-        self.output = {
-            "version": 11,
-            "randomSeed": "038ada9396ae4919ad0383b8fe134eb0",
-            "graph": {
-                "viewport": {
-                    "xmin": -10,
-                    "ymin": -7.595766129032258,
-                    "xmax": 10,
-                    "ymax": 7.595766129032258
-                }
-            },
-            "expressions": {
-                "list": []
-            },
-            "includeFunctionParametersInRandomSeed": True
-        }
-        # print(self.current_token)
-        self.position = 0
-        # until end of program
-
-        while self.current_token is not None:
-            if self.current_token[0] != "line":
+        self.program = nodes.Program()
+        self.block = self.program.statements
+        self.resolve_imports()
+        key = None
+        if self.result_cache is not None:
+            key = self.result_key()
+            entry = self.result_cache.get(key)
+            if entry is not None:
+                self.reuse_result(entry)
+                return
+        self.parse_statements()
+        self.generate()
+        if key is not None:
+            self.result_cache.put(key, {
+                "state": self.output,
+                # what the compile reported, so compiling again from the cache reports the same
+                "warnings": self.warnings,
+                "folded": self.folded,
+                "inlined": self.inlined,
+                "hoisted": self.hoisted,
+                "removed": self.removed,
+                "transformed": self.transformed,
+            })
+
+    def reuse_result(self, entry: dict):
+        """
+        Takes the graph from a result cache entry instead of compiling the program,
+        along with the warnings and the numbers the optimisation passes reported when it was compiled
+        """
+        self.output = entry["state"]
+        self.cached = True
+        self.warnings.extend(entry["warnings"])
+        self.folded = entry["folded"]
+        self.inlined = entry["inlined"]
+        self.hoisted = entry["hoisted"]
+        self.removed = entry["removed"]
+        self.transformed = entry["transformed"]
+
+    def result_key(self) -> str:
+        """Returns the key the program's graph is kept under in the result cache, once its imports are resolved"""
+        from results import result_key
+        modules = [(name, path, self.imports.modules[path][0] if path in self.imports.modules else None)
+                   for name, path in self.imports.paths.items()]
+        return result_key(self.code, modules, {
+            "optimise": self.optimise, "cse_min_size": self.cse_min_size,
+            "cse_min_count": self.cse_min_count, "wakascopes": self.wakascopes,
+            "stable_ids": self.stable_ids, "random_seed": self.random_seed,
+        })
+
+    def parse_statements(self):
+        """Parses statements into the current block until the end of the tokens"""
+        try:
+            while self.current_token is not None:
                 if not self.parse_statement():
                     self.raise_error("Expected statement")
-            elif self.current_token[0] == "line":
-                try:
-                    self.parse_statement()
-                except TypeError:
-                    pass
-    # substatement checks if the statement is inside a function
+        except TypeError:
+            # the parser runs into a None token when a statement isn't finished before the end of the tokens
+            if self.current_token is not None and self.peek_token(1) is not None:
+                raise
+            raise Error("Unexpected end of file", self.source, self.code.rstrip().count("\n") + 1) from None
+
+    def generate(self):
+        """Runs the optimisation passes that are turned on over the syntax tree, and generates self.output"""
+        if self.optimise or self.wakascopes:
+            # only imported when a pass is turned on, most compiles don't need them
+            from optimizer import ConstantFolder, SubexpressionHoister, Wakascopes, remove_unused
+        if self.optimise:
+            folder = ConstantFolder(self.optimise)
+            folder.optimise(self.program)
+            self.folded, self.inlined = folder.folded, folder.inlined
+        if self.optimise >= 2:
+            hoister = SubexpressionHoister(self.cse_min_size, self.cse_min_count)
+            hoister.optimise(self.program)
+            self.hoisted = hoister.hoisted
+        if self.wakascopes:
+            wakascopes = Wakascopes(self.cse_min_size, self.cse_min_count)
+            wakascopes.optimise(self.program)
+            self.transformed = wakascopes.transformed
+        generator = CodeGenerator(self.module_cache, self.stable_ids, self.random_seed)
+        self.output = generator.generate(self.program)
+        if self.optimise:
+            expressions = self.output["expressions"]["list"]
+            self.output["expressions"]["list"] = remove_unused(expressions, generator.imported)
+            self.removed = len(expressions) - len(self.output["expressions"]["list"])
+
+    def parse_incremental(self, previous: dict) -> dict:
+        """
+        Parses the program like parse_program, one top-level statement at a time,
+        reusing the statements parsed by an earlier compile of the same file where it can.
+
+        A statement is reused if its tokens are the same and everything defined before it
+        (names, functions, macros...) is the same, so the names it defines are defined again
+        without parsing it. self.reparsed is set to the number of statements that were parsed
+
+        Arguments:
+            previous -- what the last call returned, or an empty dict
+
+        Returns:
+            the statements parsed this time, to be passed to the next call
+        """
+        self.program = nodes.Program()
+        self.resolve_imports()
+        self.reparsed = 0
+        parsed = {}
+        state = ""  # stands for everything defined so far
+        for start, end in self.top_level_spans():
+            key = (state, bytes(self.stream.kinds[start:end]), tuple(self.stream.values[start:end]))
+            entry = previous.get(key)
+            if entry is None:
+                entry = self.parse_span(start, end, state)
+                self.reparsed += 1
+            else:
+                self.apply_changes(entry[1])
+            parsed[key] = entry
+            statements, _, state = entry
+            if self.optimise or self.wakascopes:
+                # the optimisation passes change the tree, and the statements are kept for the next compile
+                statements = copy.deepcopy(statements)
+            self.program.statements.extend(statements)
+        self.generate()
+        return parsed
+
+    def top_level_spans(self):
+        """Yields (start, end) of the tokens of each top-level statement, with the line breaks after it"""
+        kinds = self.stream.kinds
+        values = self.stream.values
+        start = 0
+        depth = 0
+        ended = False  # True after a line break outside of any brackets
+        for index in range(len(kinds)):
+            if kinds[index] == LINE:
+                ended = depth == 0 and index > start
+                continue
+            if ended:
+                yield start, index
+                start = index
+                ended = False
+            if kinds[index] == PUNCTUATION:
+                if values[index] in ("{", "(", "["):
+                    depth += 1
+                elif values[index] in ("}", ")", "]"):
+                    depth -= 1
+        if start < len(kinds):
+            yield start, len(kinds)
+
+    def parse_span(self, start: int, end: int, state: str) -> tuple[list, tuple, str]:
+        """
+        Parses the statements in part of the token stream, recording what they define
+
+        Arguments:
+            start -- the index of the first token
+            end -- the index after the last token
+            state -- stands for everything defined before them
+
+        Returns:
+            (the statements, what they defined, what stands for everything defined after them)
+        """
+        self.tokens = TokenSource(self.stream, start, end)
+        self.current_token = self.tokens.current()
+        statements = []
+        self.block = statements
+        functions = len(self.functions)
+        macros = dict(self.macros)
+        special = dict(self.special)
+        imported = dict(self.imported)
+        self.symbols.journal = []
+        try:
+            self.parse_statements()
+        finally:
+            journal, self.symbols.journal = self.symbols.journal, None
+        changes = (
+            tuple(journal),
+            tuple(self.functions[functions:]),
+            tuple((name, macro) for name, macro in self.macros.items() if macros.get(name) is not macro),
+            tuple((name, value) for name, value in self.special.items() if special.get(name) != value),
+            tuple(sorted((path, scope) for path, scope in self.imported.items() if path not in imported)),
+        )
+        summary = repr((state, changes[0], changes[1], [(name, macro.key()) for name, macro in changes[2]],
+                        changes[3], changes[4]))
+        return statements, changes, content_hash(summary)
+
+    def apply_changes(self, changes: tuple):
+        """Defines everything a reused statement defined when it was parsed, see parse_span"""
+        journal, functions, macros, special, imported = changes
+        for scope, name, is_scope in journal:
+            self.symbols.define(scope, name, is_scope)
+        self.functions.extend(functions)
+        self.macros.update(macros)
+        self.special.update(special)
+        self.imported.update(imported)
 
     def parse_statement(self, mkline=True):
         """
         parse_statement parses a single statement in the language. 
-        It first skips through lines and then adds a new expression to the output. 
+        It first skips through lines and then adds a new statement to the current block. 
         If the current token is a namespace, function, expression, or note, it parses that. 
         If none of those, it raises an error. 
         It then moves the position to the next token and returns True.
@@ -514,18 +729,27 @@ class GraphLangInterpreter:
         """
         if self.current_token is None:  # if there is no statement, return true
             return True
-        while self.current_token[0] == "line":
+        while self.current_token[0] == LINE:
             # skip through extra lines
             self.next_token()
-        # if we need to make a new line, then append a new expression to the list. Otherwise, self.location stays the same
+            if self.current_token is None:  # they were the last tokens
+                return True
+        # statements in a block (mkline is False) are written into the expression the block is in
+        statement = nodes.Statement()
+        self.block.append(statement)
         if mkline == True:
-            self.location: list = self.output["expressions"]["list"]
-            self.location.append(copy.deepcopy(self.expression_template))
-        self.expression_id += 1
-        self.location[-1]["id"] = self.expression_id
-        self.location[-1]["folderId"] = self.folder_id
-        if not self.parse_namespace() and not self.parse_function() and not self.parse_expression() and not self.parse_note() and not self.parse_macro() and not self.parse_import() and not self.parse_if():
-            self.raise_error("Expected statement")
+            self.statement_start = self.tokens.mark()[:2]
+            self.memo.clear()
+        body = self.parse_namespace() or self.parse_function() or self.parse_expression()
+        if not body:
+            # an expression that wasn't ended properly is still written before the rest of the statement
+            partial = self.unterminated
+            body = self.parse_note() or self.parse_macro() or self.parse_import() or self.parse_if()
+            if not body:
+                self.raise_error("Expected statement")
+            if partial is not None:
+                body = nodes.Sequence([partial, body])
+        statement.body = body
         self.next_token()
         return True
 
@@ -534,65 +758,61 @@ class GraphLangInterpreter:
             return False
         self.next_token()
 
-        self.location[-1]["latex"] += "\\left\\{"
         # parse a value
-        self.parse_condition()
+        condition = self.parse_condition()
         if self.current_token[1] != "{":
             self.raise_error("Expected {")
         self.next_token()
-        self.location[-1]["latex"] += ":"
         while self.current_token[1] == "\n":
             self.next_token()
-        if not self.parse_value():
+        value = self.parse_value()
+        if not value:
             self.raise_error("If branches must be values")
         while self.current_token[1] == "\n":
             self.next_token()
         if self.current_token[1] != "}":
             self.raise_error("Expected }")
         self.next_token()
+        piecewise = nodes.If([(condition, value)])
         try:
             if self.current_token[1] == "elif":
-                self.location[-1]["latex"] += ","
-                self.parse_elif()
+                self.parse_elif(piecewise)
             elif self.current_token[1] == "else":
-                self.location[-1]["latex"] += ","
-                self.parse_else()
+                self.parse_else(piecewise)
         except TypeError:
             pass
-        self.location[-1]["latex"] += "\\right\\}"
 
-        return True
+        return piecewise
 
-    def parse_elif(self):
+    def parse_elif(self, piecewise):
         if self.current_token[1] != "elif":
             return False
         self.next_token()
-        self.parse_condition()
+        condition = self.parse_condition()
         if self.current_token[1] != "{":
             self.raise_error("Expected {")
         self.next_token()
-        self.location[-1]["latex"] += ":"
         while self.current_token[1] == "\n":
             self.next_token()
-        if not self.parse_value():
+        value = self.parse_value()
+        if not value:
             self.raise_error("If branches must be values")
         while self.current_token[1] == "\n":
             self.next_token()
         if self.current_token[1] != "}":
             self.raise_error("Expected }")
         self.next_token()
+        piecewise.branches.append((condition, value))
         try:
             if self.current_token[1] == "elif":
-                self.location[-1]["latex"] += ","
-                self.parse_elif()
+                self.parse_elif(piecewise)
             elif self.current_token[1] == "else":
-                self.location[-1]["latex"] += ","
-                self.parse_else()
+                self.parse_else(piecewise)
         except TypeError:
             pass
         return True
 
-    def parse_else(self):
+    def parse_else(self, piecewise):
         if self.current_token[1] != "else":
             return False
         self.next_token()
@@ -601,13 +821,15 @@ class GraphLangInterpreter:
         self.next_token()
         while self.current_token[1] == "\n":
             self.next_token()
-        if not self.parse_value():
+        value = self.parse_value()
+        if not value:
             self.raise_error("If branches must be values")
         while self.current_token[1] == "\n":
             self.next_token()
         if self.current_token[1] != "}":
             self.raise_error("Expected }")
         self.next_token()
+        piecewise.otherwise = value
         return True
 
     def parse_condition(self):
@@ -616,146 +838,145 @@ class GraphLangInterpreter:
         e.g. x < 1
         Just to be clear, it doesn't actually evaluated the condition, it just hands it to desmos
         '''
-        if not self.parse_value():
+        left = self.parse_value()
+        if not left:
             self.raise_error("Expected value")
         # valid operator types for if conditionals
         if self.current_token[1] not in ["<", ">", "==", "<=", ">=", "!="]:
             self.raise_error(f"Unexpected operator type for if: {self.current_token[1]}")  # nopep8
-        self.location[-1]["latex"] += self.current_token[1]
         conditional = copy.deepcopy(self.current_token[1])
         self.next_token()
-        if not self.parse_value():
+        right = self.parse_value()
+        if not right:
             self.raise_error(f"Expected value after {conditional}")
+        return nodes.BinaryOp(left, conditional, right)
 
     def parse_import(self):
-        """Parses an import statement - copies tokens into list
+        """Parses an import statement - compiles the module as a namespace.
+        Each module is only imported once, later imports of it only make its names available where they are
 
         Returns:
-            true if successful import
+            the Import node if successful import
     """
         if self.current_token[1] != "import":
             return False
         self.next_token()
         module_name = copy.deepcopy(self.current_token[1])
-        imported = ""
-        stdlib_path = os.path.join(os.path.dirname(
-            __file__), "..", "stdlib", self.current_token[1] + ".graphlang")
-        try:
-            self.open_import(
-                ".\\" + self.current_token[1] + ".graphlang", module_name=module_name)
-        except FileNotFoundError:
-            try:
-                self.open_import(stdlib_path,
-                                 module_name=module_name)
-            except FileNotFoundError:
-                print("file not found")
-        return True
+        path = self.imports.find(module_name)
+        if path is None:
+            self.warnings.append(f"Couldn't find module {module_name}, nothing was imported")
+            return nodes.Import(module_name)
+        if path in self.imported:
+            # drop the import statement, nothing is emitted for it, but the module's names are defined here too
+            self.block.pop()
+            variables = self.symbols.export(self.imported[path])
+            if variables is not None:
+                self.symbols.import_scope(tuple(self.scope_path), module_name, variables)
+            return nodes.Import(module_name)
+        self.imported[path] = tuple(self.scope_path) + (module_name,)
+        return self.open_import(path, module_name=module_name)
 
     def parse_note(self):
         """
-        This function parses a note definition in the language and adds the note text to the output.
+        This function parses a note definition in the language.
 
         It first checks if the current token is "note". If not, it returns False.
 
-        Then it adds the note text to the current expression.
-
-        Returns True if the note was parsed successfully, False otherwise.
+        Returns the Note if the note was parsed successfully, False otherwise.
         """
-        if self.current_token[0] != "note":
+        if self.current_token[0] != NOTE:
             return False
-        self.location.append(copy.deepcopy(self.note_template))
-        self.location[-1]["text"] += str(self.current_token[1])
+        note = nodes.Note(self.current_token[1])
         self.next_token()
-        return True
+        return note
 
     def parse_namespace(self):
         """
-        This function parses a namespace definition in the language and adds the folder to the output.
+        This function parses a namespace definition in the language.
 
         It first checks if the current token is "ns". If not, it returns False.
 
-        Then it adds the namespace name to the current expression and checks if the next token is an identifier.
+        Then it checks if the next token is an identifier, the namespace's name.
         If not, it raises an error.
 
-        Then it adds the folder to the output and changes the folder id to the current expression id.
-        It then parses all the statements inside the namespace.
+        It then parses all the statements inside the namespace into the namespace's block.
 
-        Finally, it resets the folder id back to 0 and the scope back to "global".
+        Finally, it resets the scope back to the one around the namespace.
 
-        Returns True if the namespace was parsed successfully, False otherwise.
+        Returns the Namespace if the namespace was parsed successfully, False otherwise.
         """
         if self.current_token[1] != "ns":
             return False
-        self.location[-1] = copy.deepcopy(self.folder_template)
-        self.location[-1]["id"] = self.expression_id
         self.next_token()
-        if self.current_token[0] != "identifier":
+        if self.current_token[0] != IDENTIFIER:
             self.raise_error("Expected identifier")
         # check if a scope already exists
-        try:
-            if self.current_token[1] in list(self.get_variables(self.scope_path).keys()):
-                self.set_variables(
-                    self.scope_path[:-1])[self.current_token[1]] = {}
-        except KeyError:
-            self.get_variables(
-                self.scope_path[:-1])[self.current_token[1]] = {}
-
-        # add folder to self.vars
+        if tuple(self.scope_path) + (self.current_token[1],) in self.symbols:
+            self.symbols.define(tuple(self.scope_path[:-1]), self.current_token[1], True)
 
-        # self.add_variable(self.scope_path, self.current_token[1], {})
         self.scope_path.append(self.current_token[1])
-        self.location[-1]["title"] = self.current_token[1]
-        self.folder_id = str(self.expression_id)
+        namespace = nodes.Namespace(self.current_token[1])
+        # kept even if the namespace is never closed
+        self.block[-1].body = namespace
         self.next_token()
         if self.current_token[1] != "{":
             self.raise_error("Expected { after namespace definition")
         self.next_token()
+        outer_block = self.block
+        self.block = namespace.statements
         try:
             while self.current_token[1] != "}":
                 if not self.parse_statement():
                     self.raise_error("Expected Statement inside namespace")
-                while self.current_token[0] in ["line", "comment"]:
+                while self.current_token[0] == LINE:
                     self.next_token()
         except TypeError:
             pass
+        finally:
+            self.block = outer_block
         self.scope_path.pop()
         self.next_token()
-        return True
+        return namespace
 
     def parse_block(self):
         if self.current_token[1] != "{":
             return False
         self.next_token()
-        while self.current_token[1] != "}":
-            self.parse_statement(mkline=False)
+        block = nodes.Block([])
+        outer_block = self.block
+        self.block = block.statements
+        try:
+            while self.current_token[1] != "}":
+                self.parse_statement(mkline=False)
+        finally:
+            self.block = outer_block
         if self.current_token[1] != "}":
             self.raise_error("Expected }")
         self.next_token()
-        return True
+        return block
 
     def parse_function(self):
         """
-        parse_function parses a function definition in the language and adds the function to the output.
+        parse_function parses a function definition in the language.
 
         It first checks if the current token is "fn". If not, it returns False.
 
-        Then it adds the function name and parameters to the current expression.
+        Then it parses the function name and parameters.
 
-        Then it parses all the statements inside the function.
+        Then it parses the expression inside the function.
 
-        Finally, it resets the scope back to "global" and returns True.
+        Finally, it resets the scope back to "global" and returns the Function.
 
-        Returns True if the function was parsed successfully, False otherwise.
+        Returns the Function if the function was parsed successfully, False otherwise.
 
         """
 
         if self.current_token[1] != "fn":
             return False
         self.next_token()
-        if self.current_token[0] != "identifier":
+        if self.current_token[0] != IDENTIFIER:
             self.raise_error("Expected function name after defintion")
-        self.location[-1]["latex"] += self.subscriptify(self.current_token[1])
-        self.location[-1]["latex"] += r"\left("
+        function = nodes.Function(self.current_token[1], [])
         self.add_variable(self.scope_path, self.current_token[1], {})
         self.scope_path.append(self.current_token[1])
         self.functions.append(self.current_token[1])
@@ -764,98 +985,116 @@ class GraphLangInterpreter:
             self.raise_error("Expected (")
         self.next_token()
         while self.current_token[1] != ")":
-            if self.current_token[0] != "identifier":
+            if self.current_token[0] != IDENTIFIER:
                 self.raise_error("Expected parameter")
-            self.location[-1]["latex"] += self.subscriptify(self.scope_path[-1] + self.current_token[1])  # nopep8
+            function.parameters.append(self.current_token[1])
             self.add_variable(self.scope_path, self.current_token[1], None)
             self.next_token()
             if self.current_token[1] == ")":
-                self.location[-1]["latex"] += r"\right)"
                 self.next_token()
                 break
             if self.current_token[1] != ",":
                 self.raise_error("Expected ',' between parameters")
-            self.location[-1]["latex"] += ","
             self.next_token()
         if self.current_token[1] != "{":
             self.raise_error("Expected { after function definition")
 
-        self.location[-1]["latex"] += "="
-
         self.next_token()
-        while self.current_token[0] in ["line", "comment"]:
+        while self.current_token[0] == LINE:
             self.next_token()
-        if not self.parse_expression():
+        function.body = self.parse_expression()
+        if not function.body:
             self.raise_error("Expected Statement")
-        while self.current_token[0] in ["line", "comment"]:
+        while self.current_token[0] == LINE:
             self.next_token()
         if self.current_token[1] != "}":
             self.raise_error("'}' was not closed")
         self.scope_path.pop()
-        return True
+        return function
 
+    @memoized
     def parse_expression(self):  # x + 1
         """
-        parse_expression parses an expression from the source code. 
-        It first attempts to parse a point, and if that fails, 
-        it attempts to parse a function call, a value, a list, or a point. 
-        If any of those fail, it raises an error. 
-        After parsing the first part of the expression, 
-        it checks to see if there is an operator, 
-        and if there is, it parses the rest of the expression. 
-        It keeps track of the current position and the current latex string 
-        so that if a parse fails, it can go back to the position 
-        right before the parse started and try a different parse. ]
-        t also keeps track of the current scope and the current folder id.
+        parse_expression parses an expression from the source code, by precedence climbing.
+        It parses a value (a point, function call, value, list...), then as long as
+        there is an operator after it, the operator and the next value.
+        Operators are kept on a stack until an operator that binds less tightly comes up,
+        so the expression is parsed in one loop, without recursing for every operator.
 
         Returns:
-            bool: True if the expression was parsed successfully, False otherwise.
+            the expression's node if the expression was parsed successfully, None otherwise.
         """
-
-        # check if it is a point first:
-        # safety in case it isn't a point so we can jump back here
-        return_latex = copy.deepcopy(self.location[-1]["latex"])
-        return_location = copy.deepcopy(self.position)
-        try:
-            if not self.parse_point():
-                self.position = return_location - 1
-                self.location[-1]["latex"] = return_latex
-            else:
-                if self.parse_operator():
-                    self.parse_expression()
-                if self.current_token is not None:
-                    if self.current_token[0] == "line" or self.current_token[1] in [",", "]", ")"]:
-                        return True
-                else:
-                    return True
-        except Error:
-            self.position = return_location - 1
-            self.location[-1]["latex"] = return_latex
-        self.next_token()
-        if self.current_token[1] == "(":
-            self.location[-1]["latex"] += "\\left("
-            self.next_token()
-            self.parse_expression()
-            if self.current_token[1] != ")":
-                self.raise_error("Expected )")
-            else:
-                self.location[-1]["latex"] += "\\right)"
+        start = self.tokens.mark()
+        operands = []
+        operators = []
+        while True:
+            # a - in front of a value binds tighter than anything but ^
+            while self.current_token is not None and self.current_token[1] == "-":
+                operators.append(NEGATE)
                 self.next_token()
-            if self.parse_operator():
-                self.parse_expression()
-
-        else:
-            if not self.parse_function_call() and not self.parse_macro_call() and not self.parse_value() and not self.parse_list() and not self.parse_point() and not self.parse_comprehension() and not self.parse_block():
-                return False
-            if self.parse_operator():
-                self.parse_expression()
+            operand = self.parse_operand() if self.current_token is not None else None
+            if not operand:
+                if not operands and not operators:
+                    self.reset_position(start)
+                    self.unterminated = None
+                    return None
+                operand = None
+            operands.append(operand)
+            if operand is None:
+                break
+            operator = self.parse_operator()
+            if not operator:
+                break
+            precedence = PRECEDENCE[operator]
+            while operators and (PRECEDENCE[operators[-1]] > precedence or (
+                    PRECEDENCE[operators[-1]] == precedence and operator not in RIGHT_ASSOCIATIVE)):
+                self.reduce_operator(operands, operators.pop())
+            operators.append(operator)
+        while operators:
+            self.reduce_operator(operands, operators.pop())
+        expression = operands[0]
 
         if self.current_token is not None:
             # tokens that can end an expression
-            if self.current_token[0] == "line" or self.current_token[1] in [",", "]", ")", "}"]:
-                return True
+            if self.current_token[0] == LINE or self.current_token[1] in [",", "]", ")", "}"]:
+                return expression
         else:
-            return True
+            return expression
+        self.unterminated = expression
+        return None
+
+    def reduce_operator(self, operands, operator):
+        """Replaces the operands an operator was applied to with the operation"""
+        if operator == NEGATE:
+            operands[-1] = nodes.Negate(operands[-1])
+            return
+        right = operands.pop()
+        left = operands.pop()
+        operands.append(nodes.BinaryOp(left, operator, right))
+
+    def parse_operand(self):
+        """
+        Parses anything operators can go between: a point or bracketed expression,
+        function call, macro call, value, list, comprehension or block
+
+        Returns:
+            the node, or False if there isn't one
+        """
+        if self.current_token[1] == "(":
+            return self.parse_point()
+        return self.parse_function_call() or self.parse_macro_call() or self.parse_value() or self.parse_list() or self.parse_comprehension() or self.parse_block()
+
+    def parse_partial_expression(self):
+        """
+        Parses an expression, also returning it if it isn't followed by a token that can end an expression
+
+        Returns:
+            the expression's node, or None if there is no expression
+        """
+        expression = self.parse_expression()
+        if expression is None:
+            return self.unterminated
+        return expression
 
     def parse_macro(self):
         """
@@ -880,9 +1119,9 @@ class GraphLangInterpreter:
             return False
         self.next_token()
         macro_name = self.current_token[1]
-        if self.current_token[0] != "identifier":
+        if self.current_token[0] != IDENTIFIER:
             self.raise_error("Expected identifier after macro")
-        self.macros.append({"name": macro_name, "latex": "", "args": []})  # nopep8
+        args = []
         self.add_variable(self.scope_path, self.current_token[1], {})
         self.scope_path.append(self.current_token[1])
         self.next_token()
@@ -893,81 +1132,83 @@ class GraphLangInterpreter:
             self.raise_error("Expected (")
         self.next_token()
         while self.current_token[1] != ")":
-            if self.current_token[0] != "identifier" and self.current_token[1] not in ["__name__"]:
+            if self.current_token[0] != IDENTIFIER and self.current_token[1] not in ["__name__"]:
                 self.raise_error("Expected parameter")
             self.add_variable(self.scope_path, self.current_token[1], {})
-            self.macros[-1]["args"].append(self.current_token[1])
+            args.append(self.current_token[1])
             self.next_token()
             if self.current_token[1] == ")":
                 self.next_token()
                 break
             if self.current_token[1] != ",":
                 self.raise_error("Expected ',' between parameters")
-            self.macros[-1]["latex"] += ","
             self.next_token()
         if self.current_token[1] != "{":
             self.raise_error("Expected { after function definition")
         self.next_token()
+        # the body is kept as tokens, so calls don't have to lex it again
+        source, _ = self.tokens.location()
+        body = TokenStream(source)
+        if self.current_token[0] == LINE:
+            self.next_token()
         brackets = 0
         while self.current_token[1] != "}" or brackets != 0:
             if self.current_token[1] == "{":
                 brackets += 1
             elif self.current_token[1] == "}":
                 brackets -= 1
-            self.macros[-1]["latex"] += str(self.current_token[1])
+            body.append(*self.current_token, -1, self.tokens.location()[1])
             self.next_token()
-        self.macros[-1]["latex"] = self.macros[-1]["latex"][1:]
+        self.macros[macro_name] = MacroTemplate(macro_name, args, body)
         self.scope_path.pop()
-        return True
+        return nodes.MacroDefinition(macro_name)
 
     def parse_comprehension(self):
         """Parses a list comprehension 
         [2i for i=[1,2,3,4,5]]
 
         """
-        if self.current_token[0] != "identifier" and self.tokens[self.position+1][1] != ",":
+        if self.current_token[0] != IDENTIFIER and self.peek_token(1)[1] != ",":
             return False
-        self.location[-1]["latex"] += self.current_token[1]
+        expression = self.current_token[1]
         self.next_token()
         if self.current_token[1] != "for":
             self.raise_error("Expected 'for'")
-        self.location[-1]["latex"] += r"\operatorname{for}"
         self.next_token()
-        if self.current_token[0] != "identifier":
+        if self.current_token[0] != IDENTIFIER:
             self.raise_error("Expected identifier after 'for'")
         identifier = self.current_token[1]
-        self.location[-1]["latex"] += self.current_token[1]
         self.next_token()
         if self.current_token[1] != "=":
             self.raise_error("expected '=' ")
         self.next_token()
-        self.location[-1]["latex"] += "="
-        if not self.parse_list():
+        values = self.parse_list()
+        if not values:
             self.raise_error(f"{identifier} must be a list, not")
         self.next_token()
-        return True
+        return nodes.Comprehension(expression, identifier, values)
 
     def parse_list(self):
         """Parses a list
         e.g. [1,2,3,4]
         Returns:
-            _description_
+            the List, or False if it isn't a list
         """
         if self.current_token[1] != "[":
             return False
-        self.location[-1]["latex"] += r"\left["
+        items = []
         self.next_token()
         while self.current_token[1] != "]":
-            self.parse_expression()
+            item = self.parse_partial_expression()
+            if item is not None:
+                items.append(item)
             if self.current_token[1] == "]":
                 break
             if self.current_token[1] != ",":
                 self.raise_error("expressions must be separated by a ','")
-            self.location[-1]["latex"] += ","
             self.next_token()
-        self.location[-1]["latex"] += r"\right]"
         self.next_token()
-        return True
+        return nodes.List(items)
 
     def parse_value(self):  # 1232, or x, y or hello
         # check if current token is an identifier or literal
@@ -975,67 +1216,72 @@ class GraphLangInterpreter:
         Parses a value from the source code, which can be an identifier, literal, or unary operation.
 
         The function first checks if the current token is an identifier, literal, or a unary operator
-        such as '-' or '+'. If the token is a unary operator, it adjusts the current latex string
-        accordingly.
+        such as '-' or '+'. If the token is a unary operator, the value is negated.
 
         If the token is an identifier, it attempts to define it as a variable if it is followed by
-        an '=' sign, while also storing it in the current scope. It checks if the variable already
-        exists in the scope and raises an error if it is not defined. If the identifier is part of
-        a member access (indicated by a '.' token), it parses the expression further.
+        an '=' sign at the start of a statement, while also storing it in the current scope. It checks
+        if the variable already exists in the scope and raises an error if it is not defined. If the
+        identifier is part of a member access (indicated by a '.' token), it parses the expression further.
 
-        For literals, it converts them to a string and appends it to the latex representation.
+        For literals, the value is kept as it is.
 
-        Finally, it processes any list access and returns True if the value is parsed successfully.
+        Finally, it processes any list access and returns the value if it is parsed successfully.
 
         Returns:
-            bool: True if the value is parsed successfully, False otherwise.
+            the value's node if the value is parsed successfully, False otherwise.
         """
         if self.current_token is not None:
-            if (self.current_token[0] not in ["identifier", "literal"]) and self.current_token[1] not in ["-", "+"]:
+            if (self.current_token[0] not in (IDENTIFIER, LITERAL)) and self.current_token[1] not in ["-", "+"]:
                 return False
         else:
-            return True
+            return nodes.Literal("")
+        negative = False
         if self.current_token[1] == "-":
-            self.location[-1]["latex"] += "-"
+            negative = True
             self.next_token()
         # if it is a literal, decide if it is already defined in the current scope
-        if self.current_token[0] == "identifier":
+        if self.current_token[0] == IDENTIFIER:
+            at_start = self.at_statement_start()
             # define variable
-            if self.location[-1]["latex"] == "" and self.tokens[self.position + 1][1] == "=":
+            if at_start and self.peek_token(1)[1] == "=":
                 try:
                     self.add_variable(
                         self.scope_path, self.current_token[1], None)
                     self.special["__name__"] = self.current_token[1]
-                    print(self.special)
                 except KeyError:
                     self.add_variable(
                         self.scope_path, self.current_token[1], None)
                     self.special["__name__"] = self.current_token[1]
-                    print(self.special)
-            path = copy.deepcopy(self.scope_path)
-            path.append(self.current_token[1])
             # check if variable exists
             if not self.check_variable(self.scope_path, self.current_token[1]):
                 self.raise_error(f"Variable {self.current_token[1]} not defined")  # nopep8
-            if self.tokens[self.position + 1][1] == ".":
+            if self.peek_token(1)[1] == ".":
+                name = self.current_token[1]
                 self.next_token()
                 self.next_token()
-                self.parse_expression()
+                if at_start:
+                    # nothing is written for `name.`, so the member can still be defined
+                    self.statement_start = self.tokens.mark()[:2]
+                value = nodes.Member(name, self.parse_expression())
                 self.scope_path.pop()
-
+                # the member's expression already ends on the token after it
+                return nodes.Negate(value) if negative else value
             else:
-                try:
-                    self.location[-1]["latex"] += self.subscriptify(
-                        self.scope_path[-1] + str(self.current_token[1]))
-                except IndexError:
-                    self.location[-1]["latex"] += self.subscriptify(
-                        self.current_token[1])
+                value = nodes.Name(self.current_token[1], tuple(self.scope_path))
 
         else:
-            self.location[-1]["latex"] += str(self.current_token[1])  # nopep8
+            value = nodes.Literal(self.current_token[1])
         self.next_token()
-        self.parse_list_access()
-        return True
+        index = self.parse_list_access()
+        if index:
+            value = nodes.Index(value, index)
+        if negative:
+            value = nodes.Negate(value)
+        return value
+
+    def at_statement_start(self) -> bool:
+        """Returns True if nothing of the current statement has been parsed yet"""
+        return self.tokens.mark()[:2] == self.statement_start
 
     def parse_list_access(self):
         """
@@ -1045,11 +1291,11 @@ class GraphLangInterpreter:
         If so, it proceeds to parse the list. If not, it returns False.
 
         Returns:
-            bool: False if the current token is not '[', indicating no list access.
+            the List being accessed with, or False if the current token is not '[', indicating no list access.
         """
 
         if self.current_token[1] == "[":
-            self.parse_list()
+            return self.parse_list()
         else:
             return False
 
@@ -1061,48 +1307,45 @@ class GraphLangInterpreter:
         If so, it proceeds to parse the function call. If not, it returns False.
 
         Returns:
-            bool: False if the current token is not an identifier or a built-in function, indicating no function call.
+            the Call, or False if the current token is not an identifier or a built-in function, indicating no function call.
         """
         if self.current_token[1] not in self.functions and self.current_token[1] not in self.builtins:
             return False
-        if self.current_token[1] in ["polygon", "rgb", "hsv"]:
-            self.location[-1]["latex"] += "\\operatorname{" + self.current_token[1] + "}" + "\\left("  # nopep8
-        elif self.current_token[1] in self.functions:
-            self.location[-1]["latex"] += self.subscriptify(self.current_token[1]) + "\\left("  # nopep8
-        else:
-            self.location[-1]["latex"] += "\\" + self.current_token[1] + "\\left("  # nopep8
         function = self.current_token[1]
+        call = nodes.Call(function, [], function in self.functions)
         self.next_token()
         if self.current_token[1] != "(":
             self.raise_error("Expected '('")
         self.next_token()
-        if not self.parse_expression():
+        argument = self.parse_expression()
+        if not argument:
             self.raise_error("Expected expression")
+        call.arguments.append(argument)
         while self.current_token[1] != ")":
             if self.current_token[1] != ",":
                 self.raise_error("Expected ',' after parameter")
-            self.location[-1]["latex"] += ","
             self.next_token()
-            if not self.parse_expression():
+            argument = self.parse_expression()
+            if not argument:
                 self.raise_error(f"Expected expression after {function}")
-        self.location[-1]["latex"] += "\\right)"
+            call.arguments.append(argument)
         self.next_token()
-        return True
+        return call
 
     def parse_macro_call(self):
         """
         Parses a macro call (e.g. Rectangle!())
-        Automatically injects the tokens from the macro into the token list
+        Splices the macro's body into the token list, with the arguments in place of its parameters
         :returns False: if macro is parsed incorrectly, or it just isn't  macro
         :rtype: bool
         :returns True: successful macro passing
         :raises SyntaxError: if macro is not defined       
         """
-        if self.tokens[self.position + 1][1] != "!":
+        if self.peek_token(1)[1] != "!":
             return False
 
-        if self.current_token[1] in [i["name"] for i in self.macros]:
-            macro = next((item for item in self.macros if item['name'] == self.current_token[1]), None)  # nopep8
+        if self.current_token[1] in self.macros:
+            macro = self.macros[self.current_token[1]]
             self.next_token()
             if self.current_token[1] != "!":
                 self.raise_error("Expected ! after macro name")
@@ -1110,65 +1353,78 @@ class GraphLangInterpreter:
             if self.current_token[1] != "(":
                 self.raise_error("Expected ( after macro name")
             self.next_token()
-            macro_text = macro["latex"]
+            source, line_nr = self.tokens.location()
 
-            for arg in macro["args"]:
+            # each argument is the tokens up to the next comma outside of brackets
+            call_arguments = []
+            brackets = 0
+            if self.current_token[1] != ")":
+                call_arguments.append(TokenStream(source))
+            while self.current_token[1] != ")" or brackets != 0:
+                if self.current_token[1] == "," and brackets == 0:
+                    call_arguments.append(TokenStream(source))
+                    self.next_token()
+                    continue
+                if self.current_token[1] in ["(", "[", "{"]:
+                    brackets += 1
+                elif self.current_token[1] in [")", "]", "}"]:
+                    brackets -= 1
+                call_arguments[-1].append(*self.current_token, -1, self.tokens.location()[1])
+                self.next_token()
+
+            arguments = []
+            for arg in macro.args:
                 if arg in ["__name__"]:
                     if self.special[arg] == "":
-                        self.special[arg] = "" + macro["name"] + "Object"
-
-                    self.previous_token()
-                    self.previous_token()
-                    self.tokens.pop(self.position)
-                    self.tokens.pop(self.position)
-                    self
-                    macro_text = macro["latex"].replace("{" + arg + "}", " " + copy.deepcopy(self.special[arg]))  # nopep8
+                        self.special[arg] = "" + macro.name + "Object"
+                    arguments.append(TokenStream.from_tokens([(IDENTIFIER, self.special[arg])], source, line_nr))
                     continue
-                if self.current_token[1] != ")":
-                    macro_text = macro["latex"].replace("{" + arg + "}", self.current_token[1])  # nopep8
+                if not call_arguments:
+                    self.raise_error(f"Missing argument {arg} for {macro.name}!")
+                arguments.append(call_arguments.pop(0))
+            if call_arguments:
+                self.raise_error(f"Too many arguments for {macro.name}!")
 
-            # update lines, code and token list
+            # splice the expansion in after the call
             self.next_token()
-            self.tokens.insert(self.position + 1, ("line", "\n"))
-            for token in reversed(self.lex(macro_text)):
-                self.tokens.insert(self.position + 1, token)
-            self.tokens.insert(self.position + 1, ("line", "\n"))
-
-            self.code = ' '.join([str(token[1]) for token in self.tokens])
-            self.lines = self.code.splitlines()
-            return True
+            source, line_nr = self.tokens.location()
+            newline = TokenStream.from_tokens([(LINE, "\n")], source, line_nr)
+            self.tokens.splice_slices((newline, 0, 1), *macro.instantiate(arguments), (newline, 0, 1))
+            return nodes.MacroCall(macro.name)
         else:
             self.raise_error("Macro not defined")
 
     def parse_point(self):
-        """parses a point
+        """parses a point, or an expression in brackets
 
         Returns:
-            ...
+            the Point or Group, or False if it doesn't start with a bracket
         """
         if self.current_token[1] != "(":
             return False
         self.next_token()
-        self.location[-1]["latex"] += r"\left("
-        if not self.parse_expression():
-            self.raise_error("Points must have two coordinates")
+        x = self.parse_partial_expression()
         if self.current_token[1] != ",":
-            self.raise_error("Expected ',' in point")
-        self.location[-1]["latex"] += self.current_token[1]
+            if self.current_token[1] != ")":
+                self.raise_error("Expected )")
+            self.next_token()
+            return nodes.Group(x)
+        if not x:
+            self.raise_error("Points must have two coordinates")
         self.next_token()
-        if not self.parse_expression():
+        y = self.parse_expression()
+        if not y:
             self.raise_error("Points must have two coordinates")
-        self.location[-1]["latex"] += r"\right)"
         if self.current_token[1] != ")":
             self.raise_error("Expected ')'")
         self.next_token()
-        return True
+        return nodes.Point(x, y)
 
     def parse_operator(self):
         """Parses an operator
 
         Returns:
-            True if parsed successfully, ... 
+            the operator if parsed successfully, ... 
             False (i am sure you can figure out when false is returned )
         """
         if self.current_token is not None:
@@ -1176,28 +1432,209 @@ class GraphLangInterpreter:
                 return False
         else:
             return False
-        if self.current_token[1] == "->":
-            self.location[-1]["latex"] += "\\to "
-        else:
-            self.location[-1]["latex"] += str(self.current_token[1])
+        operator = self.current_token[1]
         self.next_token()
-        return True
+        return operator
 
 
-if __name__ == "__main__":
-    os.system("cls")
+def compile(source: str, *, filename: str = "<string>", import_paths: list[str] | None = None,
+            module_cache: ModuleCache | None = None, **options) -> dict:
+    """
+    Compiles a program into a desmos graph state, without printing anything or touching the clipboard.
+    Safe to call from many threads at once, also with the same module cache
+
+    Arguments:
+        source -- the program
+        filename -- the name of the program's file, for errors
+        import_paths -- directories to look for imported modules in, in order,
+            defaults to the current directory and then the standard library
+        module_cache -- the module cache to use, defaults to none at all, so nothing is read from or written to disk
+        options -- other GraphLangInterpreter options, like optimise or stable_ids
+
+    Returns:
+        the graph state
+
+    Raises:
+        CompileError -- if the program has an error in it
+    """
+    if module_cache is None:
+        module_cache = ModuleCache(enabled=False)
     try:
-        print(colors.BLUE + "Looking for - " + sys.argv[1] + colors.END)
-        time.sleep(0.1)
-    except IndexError:
+        compiler = GraphLangInterpreter(source, filename=filename, module_cache=module_cache,
+                                        import_paths=import_paths, **options)
+        compiler.parse_program()
+    except Error as error:
+        raise CompileError(error.args[0], error.source.name if error.source is not None else None,
+                           error.line_number) from None
+    return compiler.output
+
+
+def main(argv=None):
+    """Command line entry point: compiles a graphlang file and copies the output to the clipboard
+
+    Arguments:
+        argv -- command line arguments, defaults to sys.argv[1:]
+    """
+    arg_parser = argparse.ArgumentParser(
+        prog="interpreter.py", description="Compiles graphlang code into a desmos graph")
+    arg_parser.add_argument("file", nargs="?", help="the .graphlang file to compile")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="compile everything from scratch, without reading or writing the module cache "
+                                 "or the cache of compiled graphs")
+    arg_parser.add_argument("--optimise", type=int, default=0, choices=(0, 1, 2), metavar="LEVEL",
+                            help="optimisation level: 1 folds arithmetic on numbers and removes unused imported "
+                                 "expressions, 2 also inlines namespace variables set to numbers and moves repeated "
+                                 "calculations into variables. -O0, -O1 and -O2 are short for it")
+    arg_parser.add_argument("-O", dest="optimise", action="store_const", const=1, help="the same as -O1")
+    arg_parser.add_argument("--cse-min-size", type=int, default=3,
+                            help="at -O2, the fewest values and operations a repeated calculation needs "
+                                 "to be moved into a variable of its own (default 3)")
+    arg_parser.add_argument("--cse-min-count", type=int, default=2,
+                            help="at -O2, the fewest times a calculation has to be repeated in a namespace "
+                                 "to be moved into a variable of its own (default 2)")
+    arg_parser.add_argument("--wakascopes", action="store_true",
+                            help="rewrite functions that repeat a calculation to pass it to a helper function, "
+                                 "so desmos works it out once per call")
+    arg_parser.add_argument("--random-seed", metavar="SEED",
+                            help="the seed for desmos' random values: 32 hex digits, or any text to be hashed into "
+                                 "them. The same program and seed always give the same graph")
+    arg_parser.add_argument("--result-cache-size", type=int, default=64, metavar="MB",
+                            help="how large the cache of compiled graphs on disk can get (default 64 MB)")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="compile the file again every time it or a module it imports is saved, "
+                                 "giving expressions ids that don't change between compiles")
+    arg_parser.add_argument("--diff", metavar="STATE",
+                            help="copy only the expressions added, changed or removed since the graph saved in STATE, "
+                                 "then save the new graph there. Turns on ids that don't change between compiles")
+    arg_parser.add_argument("--out", metavar="FILE",
+                            help="write the graph to FILE instead of copying it to the clipboard "
+                                 "(with --batch, the directory to write the graphs to)")
+    arg_parser.add_argument("--stdout", action="store_true",
+                            help="write the graph to stdout instead of copying it to the clipboard, "
+                                 "printing everything else to stderr")
+    arg_parser.add_argument("--clipboard", action="store_true",
+                            help="copy the graph to the clipboard as well as writing it with --out or --stdout")
+    arg_parser.add_argument("--headless", action="store_true",
+                            help="compile without clearing the console or waiting for input, as happens anyway "
+                                 "when the output isn't a terminal or with --out or --stdout")
+    arg_parser.add_argument("--batch", action="store_true",
+                            help="compile every .graphlang file in a directory, or matching a glob, on a pool of "
+                                 "processes, writing each graph next to its file or into the --out directory")
+    arg_parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                            help="how many processes --batch compiles on (default: one per CPU)")
+    arg_parser.add_argument("--serve", action="store_true",
+                            help="keep running, compiling programs sent as JSON lines on stdin, "
+                                 "or on a Unix socket with --socket (see server.py)")
+    arg_parser.add_argument("--socket", metavar="PATH",
+                            help="the Unix socket --serve listens on, instead of stdin and stdout")
+    arg_parser.add_argument("--print-imports", action="store_true",
+                            help="print the modules the file imports, directly or indirectly, instead of compiling it")
+    # the level is only ever attached to -O, so `-O file.graphlang` doesn't take the file as the level
+    argv = sys.argv[1:] if argv is None else argv
+    args = arg_parser.parse_args(["--optimise=" + arg[2:] if arg.startswith("-O") and len(arg) > 2 else arg
+                                  for arg in argv])
+    options = {"optimise": args.optimise, "cse_min_size": args.cse_min_size, "cse_min_count": args.cse_min_count,
+               "wakascopes": args.wakascopes, "random_seed": args.random_seed}
+
+    def result_cache():
+        """The result cache on disk, unless caching is turned off"""
+        if args.no_cache:
+            return None
+        from results import ResultCache, DEFAULT_RESULTS_DIR
+        return ResultCache(directory=DEFAULT_RESULTS_DIR, max_bytes=args.result_cache_size * 1024 * 1024)
+
+    if args.print_imports and args.file is not None:
+        try:
+            with open(args.file, "rt", encoding="utf-8") as f:
+                compiler = GraphLangInterpreter(f.read(), filename=args.file,
+                                                module_cache=ModuleCache(enabled=not args.no_cache))
+            graph = compiler.resolve_imports()
+        except FileNotFoundError:
+            print(colors.RED + "Couldn't find " + args.file + colors.END)
+            sys.exit(1)
+        except Error as error:
+            print(error)
+            sys.exit(1)
+        print(graph.format({path: module[2] for path, module in compiler.imports.modules.items()}))
+        return
+
+    if args.serve:
+        import server
+        compile_server = server.CompileServer(ModuleCache(enabled=not args.no_cache), options, result_cache())
+        try:
+            if args.socket is not None:
+                server.serve_socket(compile_server, args.socket)
+            else:
+                server.serve_stdio(compile_server)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.batch and args.file is not None:
+        import batch
+        files = batch.find_files(args.file)
+        if not files:
+            print(colors.RED + "No .graphlang files found in " + args.file + colors.END)
+            sys.exit(1)
+        start = time.perf_counter()
+        results = batch.batch(files, out_dir=args.out, workers=args.jobs,
+                              module_cache=ModuleCache(enabled=not args.no_cache), options=options,
+                              result_cache=result_cache())
+        print(batch.summary(results, time.perf_counter() - start, min(args.jobs, len(files))))
+        sys.exit(1 if any(result[2] is not None for result in results.values()) else 0)
+
+    if args.watch and args.file is not None:
+        from watch import WatchCompiler, watch
+        module_cache = ModuleCache(enabled=not args.no_cache)
+
+        def make_compiler(code):
+            return GraphLangInterpreter(code, filename=args.file, module_cache=module_cache, stable_ids=True,
+                                        **options)
+        try:
+            watch(WatchCompiler(args.file, make_compiler), errors=(Error, FileNotFoundError),
+                  out=args.out, clipboard=args.clipboard or args.out is None)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.out is not None or args.stdout or args.headless or not sys.stdout.isatty():
+        # headless: no console animation, and errors exit instead of waiting for a key press
+        if args.file is None:
+            arg_parser.error("no file to compile")
+        graph_output = sys.stdout
+        try:
+            with open(args.file, "rt", encoding="utf-8") as f:
+                text_code = f.read()
+            # with --stdout, only the graph goes to stdout
+            with contextlib.redirect_stdout(sys.stderr if args.stdout else sys.stdout):
+                compiler = GraphLangInterpreter(text_code, filename=args.file,
+                                                module_cache=ModuleCache(enabled=not args.no_cache),
+                                                stable_ids=args.diff is not None, result_cache=result_cache(),
+                                                **options)
+                with (open(args.out, "wt", encoding="utf-8") if args.out is not None
+                      else contextlib.nullcontext(graph_output if args.stdout else None)) as out:
+                    compiler.run(args.diff, out=out, interactive=False,
+                                 clipboard=args.clipboard or (args.out is None and not args.stdout))
+        except FileNotFoundError:
+            print(colors.RED + "Couldn't find " + args.file + colors.END, file=sys.stderr)
+            sys.exit(1)
+        except Error as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        return
+
+    os.system("cls")
+    if args.file is None:
         print(colors.RED + '''Failed to start compilation. Are you sure you have passed in the file?
 Hint: try ''' + colors.END + colors.YELLOW + "py interpreter.py foo.graphlang" + colors.END
               )
-        sys.argv.append(input("Input file path: "))
-        exit()
+        input("Input file path: ")
+        sys.exit()
+    print(colors.BLUE + "Looking for - " + args.file + colors.END)
+    time.sleep(0.1)
     time.sleep(0.05)
     try:
-        with open(sys.argv[1], "rt", encoding="utf-8") as f:
+        with open(args.file, "rt", encoding="utf-8") as f:
             text_code = f.read()
             os.system("cls")
             for i in range(10):
@@ -1205,11 +1642,17 @@ Hint: try ''' + colors.END + colors.YELLOW + "py interpreter.py foo.graphlang" +
                 print(colors.GREEN + "Compiling" + ("............."*i) + colors.END)  # nopep8
                 time.sleep(0.001)
 
-            _ = GraphLangInterpreter(text_code, debug=False)
-            _.run()
+            _ = GraphLangInterpreter(text_code, debug=False, filename=args.file,
+                                     module_cache=ModuleCache(enabled=not args.no_cache),
+                                     stable_ids=args.diff is not None, result_cache=result_cache(), **options)
+            _.run(args.diff)
     except FileNotFoundError:
         print(colors.RED +
               '''Failed to start compilation. Are you sure the file exists?'''
               + colors.END
               )
         sys.exit()
+
+
+if __name__ == "__main__":
+    main()
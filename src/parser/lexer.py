@@ -0,0 +1,89 @@
+'''
+Lexer for the Graphlang programming language
+
+The master pattern is compiled once when the module is imported, so lexing a
+file is a single pass of finditer over the source.
+'''
+import re
+
+TOKEN_PATTERNS: list[tuple[str, str]] = [
+    ("keyword", r"\b(fn|ns|if|else|for|macro|import)\b"),
+    ("identifier", r"[A-Za-z_][A-Za-z0-9_]*"),
+    ("literal", r"\d+"),
+    ("punctuation", r"[\{\}\[\]\(\)\.\,\;\!]"),
+    ("operator", r"->|\+|-|\*|/|>|<|>=|<=|!=|=|\^"),
+    ("skip", r"[ \t]+"),
+    ("note", r"\".*?\"|'.*?'"),
+    ("comment", r"#.*"),
+    ("line", r"\n")
+]
+
+TOKEN_REGEX: re.Pattern = re.compile(
+    '|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_PATTERNS))
+
+# token types that never reach the parser
+IGNORED: frozenset[str] = frozenset(("skip", "comment"))
+
+
+class LexError(Exception):
+    """Raised when the lexer reaches a character that no token pattern matches"""
+
+    def __init__(self, character: str, line: int, column: int):
+        """
+        Arguments:
+            character -- the character that could not be lexed
+            line -- line number of the character (starting at 1)
+            column -- column of the character (starting at 1)
+        """
+        self.character = character
+        self.line = line
+        self.column = column
+        super().__init__(f"Unknown character: {character} at {line}: {column}")
+
+
+def tokenize(code: str):
+    """
+    Lazily lexes the code, yielding one token at a time
+
+    Arguments:
+        code -- the source code to lex
+
+    Yields:
+        (type, value, line, column, offset) for every token except whitespace and comments
+
+    Raises:
+        LexError: if a character can't be lexed
+    """
+    line = 1
+    line_start = 0
+    position = 0
+    for matcher in TOKEN_REGEX.finditer(code):
+        start = matcher.start()
+        if start != position:
+            raise LexError(code[position], line, position - line_start + 1)
+        token_type = matcher.lastgroup
+        position = matcher.end()
+        if token_type in IGNORED:
+            continue
+        value = matcher.group()
+        if token_type == "literal":
+            value = int(value)
+        yield (token_type, value, line, start - line_start + 1, start)
+        if token_type == "line":
+            line += 1
+            line_start = position
+    if position != len(code):
+        raise LexError(code[position], line, position - line_start + 1)
+
+
+def lex(code: str) -> list[tuple[str, str]]:
+    """
+    Lexes the whole of the code at once
+
+    Arguments:
+        code -- the source code to lex
+
+    Returns:
+        list of (type, value) tokens
+    """
+    return [(token[0], token[1]) for token in tokenize(code)]
@@ -0,0 +1,90 @@
+'''
+Pre-compiled macro templates
+
+A macro body is lexed once, when the macro is defined. Every `{arg}` in the
+body becomes a slot, so calling the macro only has to put the argument
+tokens into the slots; nothing is re-lexed.
+'''
+from array import array
+
+from tokens import SourceFile, TokenStream, IDENTIFIER, PUNCTUATION
+
+
+class MacroTemplate:
+    """A macro body split into runs of tokens and argument slots
+
+    Arguments:
+        name -- the name of the macro, without the !
+        args -- the names of the macro's parameters
+        tokens -- the tokens of the macro body
+    """
+    __slots__ = ("name", "args", "tokens", "segments")
+
+    def __init__(self, name: str, args: list[str], tokens: TokenStream):
+        self.name = name
+        self.args = args
+        self.tokens = tokens
+        # (start, end) for a run of body tokens, or the index of an argument
+        self.segments: list[tuple[int, int] | int] = []
+        kinds = tokens.kinds
+        values = tokens.values
+        run_start = 0
+        index = 0
+        while index < len(kinds):
+            if (index + 2 < len(kinds)
+                    and kinds[index] == PUNCTUATION and values[index] == "{"
+                    and kinds[index + 1] == IDENTIFIER and values[index + 1] in args
+                    and kinds[index + 2] == PUNCTUATION and values[index + 2] == "}"):
+                if run_start < index:
+                    self.segments.append((run_start, index))
+                self.segments.append(args.index(values[index + 1]))
+                index += 3
+                run_start = index
+            else:
+                index += 1
+        if run_start < len(kinds):
+            self.segments.append((run_start, len(kinds)))
+
+    def __repr__(self) -> str:
+        return f"MacroTemplate({self.name}!({', '.join(self.args)}), {len(self.tokens)} tokens)"
+
+    def key(self) -> tuple:
+        """Returns everything that affects what the macro expands to"""
+        return (self.name, tuple(self.args), tuple(self.tokens.kinds), tuple(self.tokens.values))
+
+    def instantiate(self, arguments: list[TokenStream]) -> list[tuple[TokenStream, int, int]]:
+        """
+        Expands the macro, without copying the body tokens
+
+        Arguments:
+            arguments -- the tokens to put in each argument's slots, in the order of self.args
+
+        Returns:
+            (stream, start, end) slices to splice into a TokenSource, in order
+        """
+        pieces = []
+        for segment in self.segments:
+            if isinstance(segment, int):
+                argument = arguments[segment]
+                pieces.append((argument, 0, len(argument)))
+            else:
+                pieces.append((self.tokens, segment[0], segment[1]))
+        return pieces
+
+    def to_data(self) -> tuple:
+        """Returns the template as plain data, so it can be stored in the module cache"""
+        tokens = self.tokens
+        source = tokens.source.name if tokens.source is not None else None
+        return (self.name, list(self.args), tokens.kinds.tobytes(), list(tokens.values),
+                tokens.lines.tobytes(), source)
+
+    @classmethod
+    def from_data(cls, data: tuple) -> "MacroTemplate":
+        """Rebuilds a template stored with to_data()"""
+        name, args, kinds, values, lines, source = data
+        tokens = TokenStream(SourceFile(source) if source is not None else None)
+        tokens.kinds.frombytes(kinds)
+        tokens.values = list(values)
+        tokens.lines.frombytes(lines)
+        tokens.offsets = array("l", [-1]) * len(tokens.values)
+        return cls(name, list(args), tokens)
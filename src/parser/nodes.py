@@ -0,0 +1,240 @@
+'''
+Syntax tree for the Graphlang compiler
+
+The parser builds these nodes, and codegen.py turns them into desmos
+expressions. Every node only stores what the code generator (or an
+optimisation pass) needs: names are kept as they were resolved while parsing,
+so nothing has to look at the scopes again.
+'''
+
+
+class Node:
+    """Base class of every syntax tree node"""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+# ====== expressions ========
+
+class Literal(Node):
+    """A number, or a token that is copied into the latex as it is"""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Name(Node):
+    """A variable
+
+    Arguments:
+        name -- the name as written
+        scope -- the scope path it was used in, the last scope is part of its desmos name
+    """
+    __slots__ = ("name", "scope")
+
+    def __init__(self, name: str, scope: tuple[str, ...]):
+        self.name = name
+        self.scope = scope
+
+
+class Member(Node):
+    """Access into a namespace (e.g. box.width), parsed inside the namespace's scope"""
+    __slots__ = ("name", "expression")
+
+    def __init__(self, name: str, expression: Node | None):
+        self.name = name
+        self.expression = expression
+
+
+class Negate(Node):
+    """A value with a - in front of it"""
+    __slots__ = ("operand",)
+
+    def __init__(self, operand: Node):
+        self.operand = operand
+
+
+class Index(Node):
+    """List access (e.g. values[1])"""
+    __slots__ = ("target", "index")
+
+    def __init__(self, target: Node, index: "List"):
+        self.target = target
+        self.index = index
+
+
+class BinaryOp(Node):
+    """Two expressions with an operator between them, including = and comparisons"""
+    __slots__ = ("left", "operator", "right")
+
+    def __init__(self, left: Node, operator: str, right: Node | None):
+        self.left = left
+        self.operator = operator
+        self.right = right
+
+
+class Group(Node):
+    """An expression in brackets"""
+    __slots__ = ("expression",)
+
+    def __init__(self, expression: Node | None):
+        self.expression = expression
+
+
+class Point(Node):
+    """A point (e.g. (1, 2))"""
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: Node, y: Node):
+        self.x = x
+        self.y = y
+
+
+class List(Node):
+    """A list (e.g. [1, 2, 3])"""
+    __slots__ = ("items",)
+
+    def __init__(self, items: list[Node]):
+        self.items = items
+
+
+class Comprehension(Node):
+    """A list comprehension (e.g. [2i for i=[1,2,3]])"""
+    __slots__ = ("expression", "variable", "values")
+
+    def __init__(self, expression: str, variable: str, values: List):
+        self.expression = expression
+        self.variable = variable
+        self.values = values
+
+
+class Call(Node):
+    """A call to a builtin or user defined function
+
+    Arguments:
+        function -- the name of the function
+        arguments -- the expressions passed to it
+        user_defined -- True if it was defined with fn
+    """
+    __slots__ = ("function", "arguments", "user_defined")
+
+    def __init__(self, function: str, arguments: list[Node], user_defined: bool):
+        self.function = function
+        self.arguments = arguments
+        self.user_defined = user_defined
+
+
+class MacroCall(Node):
+    """A macro call, the expansion itself is parsed as the statements after it"""
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Block(Node):
+    """Statements in braces, all written into the expression they are in"""
+    __slots__ = ("statements",)
+
+    def __init__(self, statements: list["Statement"]):
+        self.statements = statements
+
+
+class Sequence(Node):
+    """Expressions that are written one after the other"""
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: list[Node]):
+        self.parts = parts
+
+
+class If(Node):
+    """A piecewise expression (if ... elif ... else)
+
+    Arguments:
+        branches -- (condition, value) for the if and each elif
+        otherwise -- the value of the else branch, if there is one
+    """
+    __slots__ = ("branches", "otherwise")
+
+    def __init__(self, branches: list[tuple[Node, Node]], otherwise: Node | None = None):
+        self.branches = branches
+        self.otherwise = otherwise
+
+
+# ====== statements ========
+
+class Statement(Node):
+    """One statement, which gets its own expression id"""
+    __slots__ = ("body",)
+
+    def __init__(self, body: Node | None = None):
+        self.body = body
+
+
+class Function(Node):
+    """A function definition (fn name(parameters) { body })"""
+    __slots__ = ("name", "parameters", "body")
+
+    def __init__(self, name: str, parameters: list[str], body: Node | None = None):
+        self.name = name
+        self.parameters = parameters
+        self.body = body
+
+
+class Namespace(Node):
+    """A namespace, which becomes a desmos folder"""
+    __slots__ = ("name", "statements")
+
+    def __init__(self, name: str, statements: list[Statement] | None = None):
+        self.name = name
+        self.statements = statements if statements is not None else []
+
+
+class Note(Node):
+    """A note, which becomes a desmos text expression"""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class MacroDefinition(Node):
+    """A macro definition, which emits nothing itself"""
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Import(Node):
+    """An import statement
+
+    Arguments:
+        module -- the name it is imported as
+        namespace -- the module, parsed as a namespace
+        artifact -- the module's compiled expressions, if they were reused from the module cache
+        key -- where to store the compiled module in the module cache
+        exports -- the names the module defined, stored alongside its compiled expressions
+    """
+    __slots__ = ("module", "namespace", "artifact", "key", "exports")
+
+    def __init__(self, module: str, namespace: Namespace | None = None, artifact: dict | None = None,
+                 key: tuple | None = None, exports: dict | None = None):
+        self.module = module
+        self.namespace = namespace
+        self.artifact = artifact
+        self.key = key
+        self.exports = exports
+
+
+class Program(Node):
+    """A whole program"""
+    __slots__ = ("statements",)
+
+    def __init__(self, statements: list[Statement] | None = None):
+        self.statements = statements if statements is not None else []
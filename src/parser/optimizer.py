@@ -0,0 +1,633 @@
+'''
+Optimisation passes for the Graphlang compiler
+
+Desmos evaluates every expression again whenever anything it depends on
+changes, including arithmetic that only involves numbers, and every
+expression in the graph, used or not. These passes do that work once, in
+the compiler:
+
+    -O1  folds arithmetic on numbers, e.g. 1+1 ---> 2, and removes the
+         expressions of imported modules that nothing in the graph uses
+    -O2  also replaces namespace variables that are set to a number with that
+         number, e.g. width/2 ---> 0.5 when width = 1, and moves calculations
+         that are repeated in a namespace into a variable of their own, so
+         desmos works them out once
+
+Separately from the -O levels, --wakascopes rewrites functions that use the
+same calculation more than once into a call to a helper function that takes
+the calculation as an extra argument (a wakascope), so desmos works it out
+once per call:
+
+    f(a) = sin(a*a) + a*a  --->  f(a) = f_w1(a, a*a)
+                                 f_w1(a, w1) = sin(w1) + w1
+
+Folding rewrites the syntax tree before code generation. Removing unused
+expressions works on the generated expressions, so modules reused from the
+module cache are handled the same way.
+
+Inlined variables are still written to the graph, so they can be found and
+changed, but moving their slider no longer affects the expressions that used them.
+'''
+import math
+import re
+
+import nodes
+from codegen import variable_name
+
+# operators that are folded when both sides are numbers
+ARITHMETIC: tuple[str, ...] = ("+", "-", "*", "/", "^")
+# desmos works with doubles, so whole numbers past this can't be written exactly
+LARGEST_EXACT: int = 2 ** 53
+
+# a desmos variable name (as written by codegen.subscriptify), skipping latex commands like \left
+NAME_PATTERN = re.compile(r"\\operatorname\{[^}]*\}|\\[A-Za-z]+|([A-Za-z](?:_\{[A-Za-z0-9]*\})?)")
+# the name a definition defines, e.g. a_{bc}=... or f_{oo}\left(f_{oox}\right)=...
+DEFINITION_PATTERN = re.compile(r"([A-Za-z](?:_\{[A-Za-z0-9]*\})?)(?:\\left\(.*?\\right\))?=")
+# names that plot an equation when they are on the left of an =, rather than defining something
+PLOTTED: tuple[str, ...] = ("x", "y")
+# builtins that give a different result every time, so two calls aren't the same value
+RANDOM: tuple[str, ...] = ("random", "shuffle")
+# nodes that repeated calculations are looked for in, the rest are only looked inside
+HOISTABLE: tuple[type, ...] = (nodes.BinaryOp, nodes.Call, nodes.Point, nodes.List, nodes.Negate, nodes.Index)
+# nodes whose insides aren't looked at: other folders, and expressions with names of their own
+OPAQUE: tuple[type, ...] = (nodes.Namespace, nodes.Import, nodes.Function, nodes.Comprehension, nodes.If,
+                            nodes.MacroCall, nodes.MacroDefinition, nodes.Note)
+
+
+def number(node: nodes.Node | None) -> int | float | None:
+    """
+    Returns the number a node stands for, looking inside brackets and namespace access
+
+    Returns:
+        the number, or None if the node isn't a number
+    """
+    while isinstance(node, (nodes.Group, nodes.Member)):
+        node = node.expression
+    if isinstance(node, nodes.Literal) and type(node.value) in (int, float):
+        return node.value
+    return None
+
+
+def normalise(value: int | float) -> int | float | None:
+    """
+    Turns the result of a calculation into a number desmos reads the same way
+
+    Returns:
+        the number, with whole floats as ints, or None if it can't be written as a plain decimal
+    """
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        if value.is_integer():
+            value = int(value)
+        elif "e" in repr(value):
+            return None
+    if isinstance(value, int) and abs(value) >= LARGEST_EXACT:
+        return None
+    return value
+
+
+def calculate(left: int | float, operator: str, right: int | float) -> int | float | None:
+    """
+    Works out an arithmetic operation the way desmos would
+
+    Returns:
+        the result, or None if it should be left for desmos (division by zero, overflow...)
+    """
+    try:
+        if operator == "+":
+            value = left + right
+        elif operator == "-":
+            value = left - right
+        elif operator == "*":
+            value = left * right
+        elif operator == "/":
+            if right == 0:
+                return None
+            if isinstance(left, int) and isinstance(right, int) and left % right == 0:
+                value = left // right
+            else:
+                value = left / right
+        elif isinstance(left, int) and isinstance(right, int) and right >= 0 \
+                and abs(left).bit_length() * right <= 64:
+            value = left ** right
+        else:
+            value = math.pow(left, right)
+    except (OverflowError, ValueError, ZeroDivisionError):
+        return None
+    return normalise(value)
+
+
+def children(node: nodes.Node):
+    """Yields the nodes directly inside a node"""
+    for slot in node.__slots__:
+        value = getattr(node, slot)
+        if isinstance(value, nodes.Node):
+            yield value
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if isinstance(item, nodes.Node):
+                    yield item
+                elif isinstance(item, tuple):
+                    yield from (part for part in item if isinstance(part, nodes.Node))
+
+
+def walk(node: nodes.Node):
+    """Yields a node and everything inside it, without recursing"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(children(node))
+
+
+class ConstantFolder:
+    """Folds constant arithmetic in a syntax tree, and at level 2 inlines namespace constants
+
+    Arguments:
+        level -- the -O level, 1 or 2
+    """
+
+    def __init__(self, level: int = 1):
+        self.level = level
+        self.folded: int = 0  # operations worked out at compile time
+        self.inlined: int = 0  # variables replaced with their value
+        # desmos name -> the `name = value` of a namespace variable defined exactly once
+        self.definitions: dict[str, nodes.BinaryOp] = {}
+        # desmos name -> its value, once its definition has been folded into a number
+        self.constants: dict[str, int | float | None] = {}
+        # Import -> the desmos names defined in the imported module
+        self.module_definitions: dict[int, list[str]] = {}
+        self.folders = {
+            nodes.BinaryOp: self.fold_binary_op,
+            nodes.Negate: self.fold_negate,
+            nodes.Group: self.fold_group,
+            nodes.Name: self.fold_name,
+            nodes.Import: self.fold_import,
+        }
+
+    def optimise(self, program: nodes.Program) -> nodes.Program:
+        """Folds a whole program in place, returning it"""
+        if self.level >= 2:
+            self.find_definitions(program)
+        self.fold(program)
+        return program
+
+    # ====== inlining ========
+
+    def find_definitions(self, program: nodes.Program):
+        """
+        Finds the namespace variables that could be inlined: the ones that are defined once,
+        and never changed by an action (->)
+        """
+        changed = set()
+        seen = set()
+
+        def visit(statements, module):
+            for statement in statements:
+                body = statement.body
+                if isinstance(body, nodes.Namespace):
+                    visit(body.statements, module)
+                elif isinstance(body, nodes.Import) and body.artifact is not None:
+                    self.constants.update(body.artifact.get("constants", {}))
+                elif isinstance(body, nodes.Import) and body.namespace is not None:
+                    self.module_definitions[id(body)] = []
+                    visit(body.namespace.statements, body)
+                elif isinstance(body, nodes.BinaryOp) and body.operator == "=" \
+                        and isinstance(body.left, nodes.Name) and body.left.scope:
+                    name = variable_name(body.left)
+                    if name in seen:
+                        changed.add(name)
+                    seen.add(name)
+                    self.definitions[name] = body
+                    if module is not None:
+                        self.module_definitions[id(module)].append(name)
+
+        visit(program.statements, None)
+        for node in walk(program):
+            if isinstance(node, nodes.BinaryOp) and node.operator == "->" and isinstance(node.left, nodes.Name):
+                changed.add(variable_name(node.left))
+        for name in changed:
+            self.definitions.pop(name, None)
+            self.constants.pop(name, None)
+
+    def constant(self, name: str) -> int | float | None:
+        """
+        Returns the value of a namespace constant, folding its definition the first time it's needed
+
+        Returns:
+            the number, or None if the variable isn't a constant
+        """
+        if name in self.constants:
+            return self.constants[name]
+        definition = self.definitions.get(name)
+        if definition is None:
+            return None
+        self.constants[name] = None  # a definition that uses itself isn't a constant
+        definition.right = self.fold(definition.right)
+        self.constants[name] = number(definition.right)
+        return self.constants[name]
+
+    # ====== folding ========
+
+    def fold(self, node: nodes.Node | None) -> nodes.Node | None:
+        """
+        Folds a node and everything inside it
+
+        Returns:
+            the node to use in its place
+        """
+        if node is None:
+            return None
+        folder = self.folders.get(type(node))
+        if folder is not None:
+            return folder(node)
+        for slot in node.__slots__:
+            value = getattr(node, slot)
+            if isinstance(value, nodes.Node):
+                setattr(node, slot, self.fold(value))
+            elif isinstance(value, list):
+                setattr(node, slot, [self.fold_item(item) for item in value])
+        return node
+
+    def fold_item(self, item):
+        if isinstance(item, nodes.Node):
+            return self.fold(item)
+        if isinstance(item, tuple):
+            return tuple(self.fold_item(part) for part in item)
+        return item
+
+    def fold_binary_op(self, node: nodes.BinaryOp) -> nodes.Node:
+        # long chains of operators are folded without recursing, like they are parsed
+        stack: list[tuple] = [(node, False)]
+        results: list[nodes.Node | None] = []
+        while stack:
+            item, operands_done = stack.pop()
+            if not isinstance(item, nodes.BinaryOp):
+                results.append(self.fold(item) if operands_done is not None else item)
+            elif operands_done:
+                right = results.pop()
+                left = results.pop()
+                results.append(self.combine(item, left, right))
+            else:
+                stack.append((item, True))
+                stack.append((item.right, False))
+                # the variable being defined or changed stays a variable
+                target = item.operator in ("=", "->") and isinstance(item.left, nodes.Name)
+                stack.append((item.left, None if target else False))
+        return results[0]
+
+    def combine(self, node: nodes.BinaryOp, left: nodes.Node, right: nodes.Node | None) -> nodes.Node:
+        """Puts an operation back together from its folded operands, working it out if it can"""
+        if node.operator in ARITHMETIC:
+            left_value, right_value = number(left), number(right)
+            if left_value is not None and right_value is not None:
+                value = calculate(left_value, node.operator, right_value)
+                if value is not None:
+                    self.folded += 1
+                    return nodes.Literal(value)
+        # a negative number after an arithmetic operator, or before ^, keeps its brackets
+        if node.operator in ARITHMETIC and isinstance(right, nodes.Literal) and number(right) is not None and \
+                (number(right) < 0 or node.operator == "^" and len(str(right.value)) > 1):
+            right = nodes.Group(right)
+        if node.operator == "^" and isinstance(left, nodes.Literal) and number(left) is not None \
+                and number(left) < 0:
+            left = nodes.Group(left)
+        node.left = left
+        node.right = right
+        return node
+
+    def fold_negate(self, node: nodes.Negate) -> nodes.Node:
+        operand = self.fold(node.operand)
+        value = number(operand)
+        if value is not None:
+            return nodes.Literal(normalise(-value))
+        node.operand = operand
+        return node
+
+    def fold_group(self, node: nodes.Group) -> nodes.Node:
+        expression = self.fold(node.expression)
+        value = number(expression)
+        if value is not None and value >= 0:
+            return nodes.Literal(value)
+        node.expression = expression
+        return node
+
+    def fold_name(self, node: nodes.Name) -> nodes.Node:
+        if self.level < 2 or not node.scope:
+            return node
+        value = self.constant(variable_name(node))
+        if value is None:
+            return node
+        self.inlined += 1
+        return nodes.Literal(value)
+
+    def fold_import(self, node: nodes.Import) -> nodes.Node:
+        if node.namespace is None:
+            return node
+        node.namespace = self.fold(node.namespace)
+        if self.level >= 2 and node.exports is not None:
+            # stored with the compiled module, so importing it from the module cache inlines the same way
+            node.exports["constants"] = {
+                name: self.constant(name) for name in self.module_definitions.get(id(node), ())
+                if self.constant(name) is not None}
+        return node
+
+
+def names_used(latex: str) -> set[str]:
+    """Returns the desmos variable and function names in an expression's latex"""
+    return {match.group(1) for match in NAME_PATTERN.finditer(latex) if match.group(1)}
+
+
+def defined_name(latex: str) -> str | None:
+    """
+    Returns the name an expression defines
+
+    Returns:
+        the variable or function name, or None if the expression is shown on the graph:
+        a plot (y = x, polygon(...)) or an action (a = b -> c)
+    """
+    match = DEFINITION_PATTERN.match(latex)
+    if match is None or match.group(1) in PLOTTED or "\\to " in latex:
+        return None
+    return match.group(1)
+
+
+def remove_unused(expressions: list[dict], removable: set[int]) -> list[dict]:
+    """
+    Removes the expressions nothing visible on the graph depends on.
+    Everything that is plotted, every action and every note is kept, along with
+    the variables and functions those use, directly or through other definitions
+
+    Arguments:
+        expressions -- the desmos expressions, in order
+        removable -- indexes of the expressions that can be removed (the ones from imported modules)
+
+    Returns:
+        the expressions that are kept, in order
+    """
+    definitions: dict[str, list[int]] = {}
+    kept: set[int] = set()
+    pending: list[int] = []
+    for index, expression in enumerate(expressions):
+        name = defined_name(expression.get("latex", "")) if expression["type"] == "expression" else None
+        if name is not None:
+            definitions.setdefault(name, []).append(index)
+        # an imported expression with no latex (left by a macro definition) shows nothing
+        shown = expression["type"] == "text" or (
+            expression["type"] == "expression" and name is None and expression.get("latex"))
+        if index not in removable or shown:
+            kept.add(index)
+            pending.append(index)
+    while pending:
+        for name in names_used(expressions[pending.pop()].get("latex", "")):
+            for index in definitions.pop(name, ()):
+                if index not in kept:
+                    kept.add(index)
+                    pending.append(index)
+    # folders of imported modules are kept if anything is left in them
+    used_folders = {expressions[index].get("folderId") for index in kept}
+    for index in removable:
+        if expressions[index]["type"] == "folder" and str(expressions[index]["id"]) in used_folders:
+            kept.add(index)
+    return [expression for index, expression in enumerate(expressions) if index in kept]
+
+
+class SubexpressionHoister:
+    """Moves calculations repeated within a namespace into helper variables in the namespace's folder
+
+    Arguments:
+        min_size -- the fewest values and operations a calculation needs to be hoisted, at least 2
+        min_count -- the fewest times it has to appear, at least 2
+    """
+
+    def __init__(self, min_size: int = 3, min_count: int = 2):
+        self.min_size = max(min_size, 2)
+        self.min_count = max(min_count, 2)
+        self.hoisted: int = 0  # helper variables added
+        self.taken: set[str] = set()  # desmos names already used in the program
+        # scope path -> helper variables named in it, numbered per namespace so a module's helpers
+        # are named the same whichever program it is compiled in, and its cached output can be reused
+        self.helpers: dict[tuple[str, ...], int] = {}
+
+    def optimise(self, program: nodes.Program) -> nodes.Program:
+        """Hoists repeated calculations in every namespace of a program, in place, returning it"""
+        self.find_taken_names(program)
+        namespaces = [(statement.body, (statement.body.name,)) for statement in program.statements
+                      if isinstance(statement.body, nodes.Namespace)]
+        namespaces += [(statement.body.namespace, (statement.body.module,)) for statement in program.statements
+                       if isinstance(statement.body, nodes.Import) and statement.body.namespace is not None]
+        while namespaces:
+            namespace, path = namespaces.pop()
+            self.hoist(namespace, path)
+            for statement in namespace.statements:
+                if isinstance(statement.body, nodes.Namespace):
+                    namespaces.append((statement.body, path + (statement.body.name,)))
+                elif isinstance(statement.body, nodes.Import) and statement.body.namespace is not None:
+                    namespaces.append((statement.body.namespace, path + (statement.body.module,)))
+        return program
+
+    def hoist(self, namespace: nodes.Namespace, path: tuple[str, ...]):
+        """
+        Hoists the largest repeated calculation in a namespace, until there are none left
+
+        Arguments:
+            namespace -- the namespace
+            path -- the scope path of the namespace, which helper variables are defined in
+        """
+        while True:
+            occurrences = self.find_repeats(namespace.statements)
+            if not occurrences:
+                return
+            places = max(occurrences.values(), key=lambda places: places[0][0])
+            name = self.helper_name(path)
+            self.hoisted += 1
+            for _, parent, slot, index, node in places:
+                if index is None:
+                    setattr(parent, slot, nodes.Name(name, path))
+                else:
+                    getattr(parent, slot)[index] = nodes.Name(name, path)
+            value = places[0][4]
+            if isinstance(value, nodes.Group):
+                value = value.expression
+            namespace.statements.append(nodes.Statement(nodes.BinaryOp(nodes.Name(name, path), "=", value)))
+
+    def find_taken_names(self, program: nodes.Program):
+        """Collects the desmos names the program uses, so helpers can be given other names"""
+        for node in walk(program):
+            if isinstance(node, nodes.Name):
+                self.taken.add(variable_name(node))
+            elif isinstance(node, nodes.Function):
+                self.taken.add(node.name)
+                self.taken.update(node.name + parameter for parameter in node.parameters)
+            elif isinstance(node, nodes.Namespace):
+                self.taken.add(node.name)
+
+    def helper_name(self, path: tuple[str, ...]) -> str:
+        """Returns a name for a helper variable that no other variable in the graph has"""
+        while True:
+            self.helpers[path] = self.helpers.get(path, 0) + 1
+            name = f"cse{self.helpers[path]}"
+            if path[-1] + name not in self.taken:
+                self.taken.add(path[-1] + name)
+                return name
+
+    def find_repeats(self, statements: list[nodes.Statement]) -> dict[int, list[tuple]]:
+        """
+        Finds the calculations that appear often enough, and are large enough, to be hoisted
+
+        Arguments:
+            statements -- the statements of a namespace
+
+        Returns:
+            calculation -> where it appears, as (size, parent, slot, index in the slot's list, node)
+        """
+        shapes: dict[tuple, int] = {}  # the structure of a node -> a number standing for it
+        places: dict[int, list[tuple]] = {}
+        for statement in statements:
+            if statement.body is None or isinstance(statement.body, OPAQUE):
+                continue
+            # (node, parent, slot, index, children done); nodes are numbered after their children
+            stack: list[tuple] = [(statement.body, statement, "body", None, False)]
+            # (number, size, has no random calls, can be hoisted) of the nodes finished so far
+            numbers: list[tuple[int, int, bool, bool]] = []
+            while stack:
+                node, parent, slot, index, children_done = stack.pop()
+                if isinstance(node, OPAQUE):
+                    # only the same node is the same, so it can't be repeated
+                    numbers.append((shapes.setdefault((id(node),), len(shapes)), 1, False, False))
+                    continue
+                if not children_done:
+                    stack.append((node, parent, slot, index, True))
+                    for child_slot, child_index, child in reversed(list(self.child_places(node))):
+                        stack.append((child, node, child_slot, child_index, False))
+                    continue
+                count = sum(1 for _ in self.child_places(node))
+                children = numbers[len(numbers) - count:]
+                del numbers[len(numbers) - count:]
+                pure = all(child[2] for child in children)
+                size = sum(child[1] for child in children)
+                if isinstance(node, nodes.Group) and children:
+                    # brackets don't change what a calculation is
+                    number, size, pure, hoistable = children[0]
+                else:
+                    size += 1
+                    if isinstance(node, nodes.Name):
+                        shape = ("Name", variable_name(node))
+                    else:
+                        shape = (type(node).__name__,) + tuple(
+                            getattr(node, name) for name in node.__slots__
+                            if not isinstance(getattr(node, name), (nodes.Node, list, type(None))))
+                        shape += tuple(child[0] for child in children)
+                    if isinstance(node, nodes.Call) and node.function in RANDOM:
+                        pure = False
+                    number = shapes.setdefault(shape, len(shapes))
+                    hoistable = pure and isinstance(node, HOISTABLE) and not (
+                        isinstance(node, nodes.BinaryOp) and node.operator not in ARITHMETIC)
+                numbers.append((number, size, pure, hoistable))
+                # a whole statement is left alone, a plotted expression has to stay where it is,
+                # and so is the whole value of a definition, the helper would only be another name for it
+                definition = isinstance(parent, nodes.BinaryOp) and parent.operator == "=" and slot == "right"
+                if hoistable and size >= self.min_size and parent is not statement \
+                        and not isinstance(parent, nodes.Group) and not definition:
+                    places.setdefault(number, []).append((size, parent, slot, index, node))
+        return {number: found for number, found in places.items() if len(found) >= self.min_count}
+
+    @staticmethod
+    def child_places(node: nodes.Node):
+        """Yields (slot, index in the slot's list or None, child) for everything directly inside a node"""
+        for slot in node.__slots__:
+            value = getattr(node, slot)
+            if isinstance(value, nodes.Node):
+                yield slot, None, value
+            elif isinstance(value, list):
+                for index, item in enumerate(value):
+                    if isinstance(item, nodes.Node):
+                        yield slot, index, item
+
+
+class Wakascopes(SubexpressionHoister):
+    """Rewrites functions that repeat a calculation to pass it to a helper function once instead
+
+    Arguments:
+        min_size -- the fewest values and operations a calculation needs to be passed on, at least 2
+        min_count -- the fewest times it has to appear in the function, at least 2
+    """
+
+    def __init__(self, min_size: int = 3, min_count: int = 2):
+        super().__init__(min_size, min_count)
+        self.transformed: list[str] = []  # the functions that were rewritten, with their namespaces
+
+    def optimise(self, program: nodes.Program) -> nodes.Program:
+        """Rewrites every function in a program that repeats a calculation, in place, returning it"""
+        self.find_taken_names(program)
+        blocks = [(program.statements, ())]
+        while blocks:
+            statements, path = blocks.pop()
+            index = 0
+            while index < len(statements):
+                body = statements[index].body
+                if isinstance(body, nodes.Namespace):
+                    blocks.append((body.statements, path + (body.name,)))
+                elif isinstance(body, nodes.Import) and body.namespace is not None:
+                    blocks.append((body.namespace.statements, path + (body.module,)))
+                elif isinstance(body, nodes.Function) and body.body is not None \
+                        and not isinstance(body.body, (nodes.Block, nodes.Sequence)):
+                    helpers = self.rewrite(body, path)
+                    if helpers:
+                        self.transformed.append(".".join(path + (body.name,)))
+                        statements[index + 1:index + 1] = [nodes.Statement(helper) for helper in helpers]
+                        index += len(helpers)
+                index += 1
+        return program
+
+    def rewrite(self, function: nodes.Function, path: tuple[str, ...]) -> list[nodes.Function]:
+        """
+        Moves the function's body into helper functions, one for each repeated calculation,
+        each one calling the next with the calculation as an extra argument
+
+        Arguments:
+            function -- the function to rewrite
+            path -- the scope path of the namespace it is in
+
+        Returns:
+            the helper functions, in the order they are called
+        """
+        helpers = []
+        current = function
+        while True:
+            occurrences = self.find_repeats([nodes.Statement(current.body)])
+            if not occurrences:
+                return helpers
+            places = max(occurrences.values(), key=lambda places: places[0][0])
+            value = places[0][4]
+            if isinstance(value, nodes.Group):
+                value = value.expression
+            name = self.function_name(function.name)
+            parameter = f"w{len(helpers) + 1}"
+            while parameter in current.parameters:
+                parameter += "w"
+            for _, parent, slot, index, node in places:
+                if index is None:
+                    setattr(parent, slot, nodes.Name(parameter, path + (name,)))
+                else:
+                    getattr(parent, slot)[index] = nodes.Name(parameter, path + (name,))
+            helper = nodes.Function(name, current.parameters + [parameter], current.body)
+            # the parameters are named after the function they belong to
+            for node in walk(helper.body):
+                if isinstance(node, nodes.Name) and node.scope and node.scope[-1] == current.name \
+                        and node.name in current.parameters:
+                    node.scope = node.scope[:-1] + (name,)
+            self.taken.update(name + parameter for parameter in helper.parameters)
+            arguments = [nodes.Name(parameter, path + (current.name,)) for parameter in current.parameters]
+            current.body = nodes.Call(name, arguments + [value], True)
+            helpers.append(helper)
+            current = helper
+
+    def function_name(self, function: str) -> str:
+        """Returns a name for a helper function of a function, that nothing else in the graph has"""
+        number = 1
+        while f"{function}w{number}" in self.taken:
+            number += 1
+        self.taken.add(f"{function}w{number}")
+        return f"{function}w{number}"
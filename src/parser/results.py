@@ -0,0 +1,176 @@
+'''
+Cache of compiled programs for the Graphlang compiler
+
+A program's graph state depends only on its source, the modules it
+imports, the compiler options and the compiler itself, so it is stored
+under a hash of all of those, along with the warnings and optimisation
+numbers the compile reported. Compiling the same program again, from any
+process, just copies the stored graph and reports the same.
+
+The most recently used graphs are kept in memory. They can also be kept
+in a directory on disk, which is trimmed back to a maximum size by
+deleting the graphs that were used longest ago.
+'''
+import collections
+import marshal
+import os
+import threading
+
+from cache import DEFAULT_CACHE_DIR, COMPILER_VERSION, content_hash
+
+DEFAULT_RESULTS_DIR: str = os.path.join(DEFAULT_CACHE_DIR, "results")
+DEFAULT_MAX_BYTES: int = 64 * 1024 * 1024
+
+_fingerprint: str | None = None
+
+
+def compiler_fingerprint() -> str:
+    """
+    Returns a hash of the compiler's own source files, so results compiled by
+    a different version of the compiler are never used, even if COMPILER_VERSION wasn't bumped
+    """
+    global _fingerprint
+    if _fingerprint is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        files = []
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            if entry.name.endswith(".py"):
+                stat = entry.stat()
+                files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        _fingerprint = content_hash(repr((COMPILER_VERSION, files)))
+    return _fingerprint
+
+
+def result_key(source: str, modules: list[tuple[str, str | None, str | None]], options: dict) -> str:
+    """
+    Returns the key a compiled program is stored under
+
+    Arguments:
+        source -- the program
+        modules -- (name, path, contents) of every module it imports, with None for modules that weren't found
+        options -- every compiler option that changes the output
+    """
+    modules = sorted((name, path, None if text is None else content_hash(text)) for name, path, text in modules)
+    return content_hash(repr((compiler_fingerprint(), content_hash(source), modules, sorted(options.items()))))
+
+
+class ResultCache:
+    """Compiled programs, by result_key, in memory and optionally on disk.
+    Each entry is a dict with the graph state under "state", see GraphLangInterpreter.parse_program
+
+    Arguments:
+        capacity -- how many graphs to keep in memory
+        directory -- where to keep graphs on disk, or None to only keep them in memory
+        max_bytes -- how large the directory can get before the least recently used graphs are deleted
+    """
+
+    def __init__(self, capacity: int = 128, directory: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.capacity = capacity
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory: collections.OrderedDict[str, dict] = collections.OrderedDict()
+        self.lock = threading.Lock()  # compiles on other threads can share the cache
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __getstate__(self):
+        # sent to worker processes without the lock or the graphs in memory
+        return self.capacity, self.directory, self.max_bytes
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def entry_path(self, key: str) -> str:
+        """Returns the file a graph is kept in on disk"""
+        return os.path.join(self.directory, key + ".glr")
+
+    def get(self, key: str) -> dict | None:
+        """
+        Returns a copy of the entry stored under key, or None if there isn't one
+        """
+        with self.lock:
+            output = self.memory.get(key)
+            if output is not None:
+                self.memory.move_to_end(key)
+        if output is None and self.directory is not None:
+            output = self.read(key)
+            if output is not None:
+                self.remember(key, output)
+        with self.lock:
+            if output is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return marshal.loads(marshal.dumps(output))  # faster than copy.deepcopy for plain data
+
+    def put(self, key: str, output: dict) -> None:
+        """Stores a copy of a compiled program's entry"""
+        data = marshal.dumps((key, output))
+        self.remember(key, marshal.loads(data)[1])
+        if self.directory is not None:
+            self.write(key, data)
+
+    def remember(self, key: str, output: dict) -> None:
+        """Keeps a graph in memory, forgetting the least recently used one if there are too many"""
+        with self.lock:
+            self.memory[key] = output
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.capacity:
+                self.memory.popitem(last=False)
+
+    def read(self, key: str) -> dict | None:
+        """Reads a graph from disk, marking it as just used"""
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as file:
+                stored_key, output = marshal.load(file)
+            os.utime(path)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return output if stored_key == key else None
+
+    def write(self, key: str, data: bytes) -> None:
+        """Writes a graph to disk, then deletes the least recently used ones until the directory fits"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{self.entry_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, self.entry_path(key))
+            self.evict()
+        except OSError:
+            pass  # the cache is only an optimisation
+
+    def evict(self) -> None:
+        """Deletes the graphs on disk that were used longest ago, until they take up at most max_bytes"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".glr"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # another process got there first
+            total -= size
+
+    def clear(self) -> None:
+        """Forgets every graph, in memory and on disk"""
+        with self.lock:
+            self.memory.clear()
+        if self.directory is None:
+            return
+        try:
+            entries = os.listdir(self.directory)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.endswith(".glr"):
+                os.remove(os.path.join(self.directory, entry))
@@ -0,0 +1,133 @@
+'''
+Compile server for the Graphlang compiler
+
+`interpreter.py --serve` keeps one compiler process running for an editor
+to send programs to, so a compile doesn't pay for starting Python,
+importing the compiler and lexing the standard library every time.
+Imported modules, and the modules compiled from them, stay in the module
+cache between requests, and so do the graphs of programs sent before.
+
+Requests and responses are JSON, one object per line, read from stdin
+and written to stdout, or with `--socket PATH` sent over a Unix socket,
+which any number of editors can connect to:
+
+    {"id": 1, "source": "x = 1\\n", "filename": "graph.graphlang", "options": {"optimise": 2}}
+    {"id": 1, "state": {...the desmos graph state...}, "ms": 1.2}
+
+"filename" and "options" can be left out. A program that doesn't compile gets
+{"id": 1, "error": {"message": "...", "file": "...", "line": 3}} instead.
+'''
+import json
+import os
+import socketserver
+import stat
+import sys
+import time
+
+from cache import ModuleCache
+from imports import warm_cache
+import interpreter
+
+# options a request can pass to GraphLangInterpreter
+OPTIONS: tuple[str, ...] = ("optimise", "cse_min_size", "cse_min_count", "wakascopes", "stable_ids", "random_seed")
+
+
+class CompileServer:
+    """Compiles the programs sent to it, keeping the module cache warm between them
+
+    Arguments:
+        module_cache -- the module cache every compile shares
+        options -- the GraphLangInterpreter options requests start from
+        result_cache -- a results.ResultCache, so programs sent again are answered without compiling them
+    """
+
+    def __init__(self, module_cache: ModuleCache, options: dict | None = None, result_cache=None):
+        self.module_cache = module_cache
+        self.options = options or {}
+        self.result_cache = result_cache
+        warm_cache(module_cache)
+
+    def compile(self, request: dict) -> dict:
+        """
+        Compiles the program in a request
+
+        Returns:
+            the response, with either the graph state or the error
+        """
+        response = {"id": request.get("id")}
+        options = {**self.options, **request.get("options", {})}
+        unknown = [name for name in options if name not in OPTIONS]
+        if unknown:
+            response["error"] = {"message": "Unknown options: " + ", ".join(unknown)}
+            return response
+        start = time.perf_counter()
+        try:
+            # compile() is safe to run on every connection's thread at once, sharing the caches
+            state = interpreter.compile(request["source"], filename=request.get("filename", "<string>"),
+                                        module_cache=self.module_cache, result_cache=self.result_cache, **options)
+        except interpreter.CompileError as error:
+            response["error"] = {"message": error.message, "file": error.filename, "line": error.line}
+            return response
+        except Exception as error:  # a bug in the compiler shouldn't take the server down with it
+            response["error"] = {"message": f"Internal compiler error: {type(error).__name__}: {error}"}
+            return response
+        response["state"] = state
+        response["ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return response
+
+    def handle(self, line: str | bytes) -> str:
+        """
+        Answers one line of the protocol
+
+        Arguments:
+            line -- the request, as text or as the UTF-8 bytes read from a socket
+
+        Returns:
+            the response, as one line of JSON
+        """
+        try:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")  # a UnicodeDecodeError is a ValueError too
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get("source"), str):
+                raise ValueError("expected an object with the program's source")
+            if not isinstance(request.get("options", {}), dict):
+                raise ValueError("options should be an object")
+        except ValueError as error:
+            return json.dumps({"id": None, "error": {"message": "Bad request: " + str(error)}})
+        return json.dumps(self.compile(request))
+
+
+def serve_stdio(server: CompileServer):
+    """Answers requests from stdin on stdout until stdin is closed"""
+    output = sys.stdout
+    for line in sys.stdin:
+        if line.strip():
+            output.write(server.handle(line) + "\n")
+            output.flush()
+
+
+def serve_socket(server: CompileServer, path: str):
+    """
+    Answers requests from every connection to a Unix socket until interrupted
+
+    Arguments:
+        server -- the CompileServer
+        path -- where to create the socket, replacing a socket left behind by an earlier server
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip():
+                    self.wfile.write(server.handle(line).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.remove(path)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as listener:
+        listener.daemon_threads = True
+        try:
+            listener.serve_forever()
+        finally:
+            os.remove(path)
@@ -0,0 +1,125 @@
+'''
+Symbol table for the Graphlang compiler
+
+Every name a program defines is stored once, under its qualified name (the
+scopes it is in, then the name itself), so looking a name up is a dict lookup
+rather than a walk through nested dicts. Each scope also keeps the names
+defined directly in it, so a scope can be cleared or copied without touching
+the rest of the table.
+'''
+
+
+class SymbolTable:
+    """The names defined by a program
+
+    A name is either a value (a variable or parameter) or a scope (a namespace,
+    function or macro) that other names can be defined in.
+
+    Arguments:
+        builtins -- names defined in the global scope before the program starts
+    """
+    __slots__ = ("names", "scopes", "journal")
+
+    def __init__(self, builtins: list[str] | tuple[str, ...] = ()):
+        # qualified name -> True if it is a scope, False if it is a value
+        self.names: dict[tuple[str, ...], bool] = {}
+        # qualified name of a scope -> the names defined directly in it, in order
+        self.scopes: dict[tuple[str, ...], dict[str, None]] = {(): {}}
+        # every define() call, in order, while the journal is turned on (a list), so they can be repeated
+        self.journal: list[tuple[tuple[str, ...], str, bool]] | None = None
+        for name in builtins:
+            self.define((), name)
+
+    def __contains__(self, qualified_name: tuple[str, ...]) -> bool:
+        return qualified_name in self.names
+
+    def define(self, scope: tuple[str, ...], name: str, is_scope: bool = False) -> None:
+        """
+        Defines a name, replacing anything that was defined under it before.
+        Scopes in the path that don't exist yet are created
+
+        Arguments:
+            scope -- the qualified name of the scope to define it in
+            name -- the name to define
+            is_scope -- True for namespaces, functions and macros
+        """
+        if scope not in self.scopes:
+            self.define(scope[:-1], scope[-1], True)
+        qualified_name = scope + (name,)
+        self.clear(qualified_name)
+        self.names[qualified_name] = is_scope
+        self.scopes[scope][name] = None
+        if is_scope:
+            self.scopes[qualified_name] = {}
+        if self.journal is not None:
+            # after any scopes it created, so repeating the calls in order gives the same table
+            self.journal.append((scope, name, is_scope))
+
+    def clear(self, qualified_name: tuple[str, ...]) -> None:
+        """Removes everything defined inside a scope, leaving the scope itself defined"""
+        children = self.scopes.pop(qualified_name, None)
+        if children is None:
+            return
+        for child in children:
+            child_name = qualified_name + (child,)
+            self.clear(child_name)
+            del self.names[child_name]
+
+    def is_visible(self, scope: tuple[str, ...], name: str) -> bool:
+        """
+        Checks if a name can be used from a scope:
+        if it is global, or defined in the scope or any scope around it
+
+        Arguments:
+            scope -- the qualified name of the scope the name is used in
+            name -- the unqualified name
+        """
+        if (name,) in self.names:
+            return True
+        found = False
+        for depth in range(1, len(scope) + 1):
+            enclosing = scope[:depth]
+            if enclosing not in self.names:
+                return False
+            found = found or enclosing + (name,) in self.names
+        return found
+
+    def export(self, qualified_name: tuple[str, ...]) -> list[tuple[tuple[str, ...], bool]] | None:
+        """
+        Lists everything defined in a scope, so it can be stored and later given to import_scope()
+
+        Returns:
+            (name relative to the scope, is a scope) for the scope and everything in it,
+            parents first, or None if the scope isn't defined
+        """
+        if qualified_name not in self.names:
+            return None
+        entries = [((), self.names[qualified_name])]
+
+        def visit(scope, relative):
+            for child in self.scopes.get(scope, ()):
+                child_name = scope + (child,)
+                entries.append((relative + (child,), self.names[child_name]))
+                visit(child_name, relative + (child,))
+
+        visit(qualified_name, ())
+        return entries
+
+    def import_scope(self, scope: tuple[str, ...], name: str,
+                     entries: list[tuple[tuple[str, ...], bool]]) -> None:
+        """
+        Defines a name and everything in it, from a list made by export()
+
+        Arguments:
+            scope -- the qualified name of the scope to define it in
+            name -- the name to define it as
+            entries -- the output of export()
+        """
+        for relative, is_scope in entries:
+            qualified_name = scope + (name,) + tuple(relative)
+            self.define(qualified_name[:-1], qualified_name[-1], is_scope)
+
+    def nested(self, scope: tuple[str, ...] = ()) -> dict:
+        """Returns the names in a scope as nested dicts, with None for values, for printing"""
+        return {child: self.nested(scope + (child,)) if self.names[scope + (child,)] else None
+                for child in self.scopes.get(scope, ())}
@@ -0,0 +1,301 @@
+'''
+Compact token storage for the Graphlang parser
+
+Token kinds are stored as small integer codes in an array, so the parser can
+compare kinds with integer compares instead of string compares.
+Imports and macro expansions are spliced into a TokenSource as whole streams,
+rather than being inserted into the token list one token at a time.
+'''
+import sys
+from array import array
+
+import lexer
+
+# token kind codes
+KEYWORD = 0
+IDENTIFIER = 1
+LITERAL = 2
+PUNCTUATION = 3
+OPERATOR = 4
+NOTE = 5
+LINE = 6
+
+KIND_CODES: dict[str, int] = {
+    "keyword": KEYWORD,
+    "identifier": IDENTIFIER,
+    "literal": LITERAL,
+    "punctuation": PUNCTUATION,
+    "operator": OPERATOR,
+    "note": NOTE,
+    "line": LINE,
+}
+KIND_NAMES: tuple[str, ...] = tuple(KIND_CODES)
+
+
+class SourceFile:
+    """A file that tokens were lexed from
+
+    Only split into lines when an error needs to show one. If the text isn't
+    given, it is read from the file the first time a line is needed.
+    """
+    __slots__ = ("name", "text", "_lines")
+
+    def __init__(self, name: str, text: str | None = None):
+        self.name = name
+        self.text = text
+        self._lines: list[str] | None = None
+
+    def line(self, line_nr: int) -> str:
+        """Returns the text of a line (starting at 1), or "" if it doesn't exist"""
+        if self._lines is None:
+            if self.text is None:
+                try:
+                    with open(self.name, "r", encoding="utf-8") as file:
+                        self.text = file.read()
+                except OSError:
+                    self.text = ""
+            self._lines = self.text.splitlines()
+        if 0 < line_nr <= len(self._lines):
+            return self._lines[line_nr - 1]
+        return ""
+
+
+class TokenStream:
+    """Array backed list of tokens
+
+    Each token is stored across parallel arrays (kind code, value, start offset
+    and line number) rather than as its own tuple. Indexing the stream gives
+    back a (kind, value) tuple. Every token in a stream comes from the same
+    source file, so the file and line of any token can be found for errors.
+    """
+    __slots__ = ("kinds", "values", "offsets", "lines", "source")
+
+    def __init__(self, source: SourceFile | None = None):
+        self.source: SourceFile | None = source
+        self.kinds: array = array("B")
+        self.values: list = []
+        self.offsets: array = array("l")
+        self.lines: array = array("l")
+
+    @classmethod
+    def from_code(cls, code: str, source: SourceFile | None = None) -> "TokenStream":
+        """
+        Lexes the code into a new token stream
+
+        Arguments:
+            code -- the source code to lex
+            source -- the file the code came from
+
+        Raises:
+            lexer.LexError: if a character can't be lexed
+        """
+        stream = cls(source)
+        kinds = stream.kinds
+        values = stream.values
+        offsets = stream.offsets
+        lines = stream.lines
+        intern = sys.intern
+        for token_type, value, line, _, offset in lexer.tokenize(code):
+            kinds.append(KIND_CODES[token_type])
+            values.append(intern(value) if isinstance(value, str) else value)
+            offsets.append(offset)
+            lines.append(line)
+        return stream
+
+    @classmethod
+    def from_tokens(cls, tokens: list[tuple[int, str]],
+                    source: SourceFile | None = None, line: int = 0) -> "TokenStream":
+        """
+        Builds a token stream from (kind, value) tuples that don't come from source code
+
+        Arguments:
+            tokens -- (kind code, value) pairs
+            source -- the file to blame the tokens on
+            line -- line number to give every token
+        """
+        stream = cls(source)
+        for kind, value in tokens:
+            stream.append(kind, value, -1, line)
+        return stream
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index: int) -> tuple[int, str]:
+        if index < 0:
+            raise IndexError("token index out of range")
+        return (self.kinds[index], self.values[index])
+
+    def __iter__(self):
+        return zip(self.kinds, self.values)
+
+    def append(self, kind: int, value, offset: int = -1, line: int = 0) -> None:
+        """Adds a token to the end of the stream"""
+        self.kinds.append(kind)
+        self.values.append(sys.intern(value) if isinstance(value, str) else value)
+        self.offsets.append(offset)
+        self.lines.append(line)
+
+
+class _Chunk:
+    """A run of tokens [start, end) from a stream, linked to the chunks either side of it"""
+    __slots__ = ("stream", "start", "end", "prev", "next")
+
+    def __init__(self, stream: TokenStream, start: int, end: int):
+        self.stream = stream
+        self.start = start
+        self.end = end
+        self.prev: "_Chunk | None" = None
+        self.next: "_Chunk | None" = None
+
+
+class TokenSource:
+    """Cursor over a rope of token streams
+
+    The tokens are a linked list of chunks, each pointing into a TokenStream.
+    Splicing a stream in after the cursor splits the current chunk in two and
+    links the new stream between the halves, so it costs the same however big
+    the program or the spliced stream is.
+
+    Arguments:
+        stream -- the tokens to read
+        start -- the index of the first token to read
+        end -- the index after the last token to read, the end of the stream by default
+    """
+    __slots__ = ("head", "chunk", "index", "splices", "version")
+
+    def __init__(self, stream: TokenStream, start: int = 0, end: int | None = None):
+        self.head: _Chunk = _Chunk(stream, start, len(stream) if end is None else end)
+        self.chunk: _Chunk = self.head
+        self.index: int = start
+        # (chunk that was split, the chunk after the spliced streams) for every splice
+        self.splices: list[tuple[_Chunk, _Chunk]] = []
+        # changes whenever tokens are spliced in or taken out
+        self.version: int = 0
+
+    def __iter__(self):
+        chunk = self.head
+        while chunk is not None:
+            stream = chunk.stream
+            for index in range(chunk.start, chunk.end):
+                yield stream[index]
+            chunk = chunk.next
+
+    def location(self) -> tuple[SourceFile | None, int]:
+        """Returns the source file and line of the token under the cursor"""
+        chunk = self.chunk
+        if chunk.start <= self.index < chunk.end:
+            return chunk.stream.source, chunk.stream.lines[self.index]
+        return chunk.stream.source, 0
+
+    def current(self) -> tuple[int, str] | None:
+        """Returns the token under the cursor"""
+        chunk = self.chunk
+        if chunk.start <= self.index < chunk.end:
+            return chunk.stream[self.index]
+        return None
+
+    def _step(self, chunk: _Chunk, index: int, num: int) -> tuple[_Chunk, int] | None:
+        """Finds the chunk and index num tokens away from the given position"""
+        while num > 0:
+            index += 1
+            while index >= chunk.end:
+                chunk = chunk.next
+                if chunk is None:
+                    return None
+                index = chunk.start
+            num -= 1
+        while num < 0:
+            index -= 1
+            while index < chunk.start:
+                chunk = chunk.prev
+                if chunk is None:
+                    return None
+                index = chunk.end - 1
+            num += 1
+        return chunk, index
+
+    def advance(self) -> tuple[int, str] | None:
+        """
+        Moves the cursor onto the next token
+
+        Returns:
+            the next token, or None (leaving the cursor where it is) at the end
+        """
+        position = self._step(self.chunk, self.index, 1)
+        if position is None:
+            return None
+        self.chunk, self.index = position
+        return self.chunk.stream[self.index]
+
+    def retreat(self) -> tuple[int, str] | None:
+        """
+        Moves the cursor back onto the previous token
+
+        Returns:
+            the previous token, or None (leaving the cursor where it is) at the start
+        """
+        position = self._step(self.chunk, self.index, -1)
+        if position is None:
+            return None
+        self.chunk, self.index = position
+        return self.chunk.stream[self.index]
+
+    def peek(self, num: int) -> tuple[int, str] | None:
+        """Returns the token num places away from the cursor, without moving"""
+        position = self._step(self.chunk, self.index, num)
+        if position is None:
+            return None
+        return position[0].stream[position[1]]
+
+    def splice(self, *streams: TokenStream) -> None:
+        """
+        Inserts the streams, in order, directly after the token under the cursor
+
+        Arguments:
+            streams -- the token streams to splice in
+        """
+        self.splice_slices(*[(stream, 0, len(stream)) for stream in streams])
+
+    def splice_slices(self, *slices: tuple[TokenStream, int, int]) -> None:
+        """
+        Inserts parts of streams, in order, directly after the token under the cursor
+
+        Arguments:
+            slices -- (stream, start, end) for each run of tokens to splice in
+        """
+        chunk = self.chunk
+        cut = min(self.index + 1, chunk.end)
+        rest = _Chunk(chunk.stream, cut, chunk.end)
+        rest.next = chunk.next
+        if rest.next is not None:
+            rest.next.prev = rest
+        chunk.end = cut
+        previous = chunk
+        for stream, start, end in slices:
+            inserted = _Chunk(stream, start, end)
+            previous.next = inserted
+            inserted.prev = previous
+            previous = inserted
+        previous.next = rest
+        rest.prev = previous
+        self.splices.append((chunk, rest))
+        self.version += 1
+
+    def mark(self) -> tuple[_Chunk, int, int]:
+        """Returns the position of the cursor, to be passed to reset()"""
+        return (self.chunk, self.index, len(self.splices))
+
+    def reset(self, mark: tuple[_Chunk, int, int]) -> None:
+        """
+        Moves the cursor back to a position from mark(),
+        undoing any splices made since then
+        """
+        self.chunk, self.index, splice_count = mark
+        while len(self.splices) > splice_count:
+            self.version += 1
+            chunk, rest = self.splices.pop()
+            chunk.end = rest.end
+            chunk.next = rest.next
+            if rest.next is not None:
+                rest.next.prev = chunk
@@ -0,0 +1,102 @@
+'''
+Watch mode for the Graphlang compiler
+
+`interpreter.py --watch file.graphlang` compiles the file, and compiles it
+again every time it, or a module it imports, is saved. The compiler stays
+warm between saves: imported modules stay in the module cache, and only
+the top-level statements that changed are parsed again (see
+GraphLangInterpreter.parse_incremental). Expressions get stable ids, so
+pasting the new graph over the old one keeps whatever didn't change.
+'''
+import contextlib
+import io
+import os
+import time
+
+from Utils import colors
+from emit import write_state, copy_to_clipboard
+
+POLL_INTERVAL: float = 0.2  # seconds between checking if the files have changed
+
+
+class WatchCompiler:
+    """Compiles a file again and again, reusing what it can from the last compile
+
+    Arguments:
+        filename -- the file to compile
+        make_compiler -- makes a GraphLangInterpreter for the file's code,
+            which should share its module cache between calls and use stable ids
+    """
+
+    def __init__(self, filename: str, make_compiler):
+        self.filename = filename
+        self.make_compiler = make_compiler
+        self.parsed: dict = {}  # the statements of the last compile, see parse_incremental
+        self.modules: list[str] = []  # paths of the modules the file imported last time
+
+    def files(self) -> dict[str, float]:
+        """Returns the modification time of the file and every module it imports"""
+        times = {}
+        for path in [self.filename] + self.modules:
+            try:
+                times[path] = os.path.getmtime(path)
+            except OSError:
+                times[path] = 0.0
+        return times
+
+    def compile(self, modules_changed: bool = False):
+        """
+        Compiles the file
+
+        Arguments:
+            modules_changed -- True if an imported module changed, so no statements can be reused
+
+        Returns:
+            the GraphLangInterpreter, with the graph in its output
+        """
+        with open(self.filename, "rt", encoding="utf-8") as file:
+            code = file.read()
+        if modules_changed:
+            self.parsed = {}
+        compiler = self.make_compiler(code)
+        # the parser prints as it goes, which would bury the watch output
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.parsed = compiler.parse_incremental(self.parsed)
+        self.modules = compiler.import_graph.modules()
+        return compiler
+
+
+def watch(compiler: WatchCompiler, errors: tuple = (), out: str | None = None, clipboard: bool = True):
+    """
+    Compiles the file every time it changes, copying the graph to the clipboard, until interrupted
+
+    Arguments:
+        compiler -- the WatchCompiler for the file
+        errors -- compile errors to print and carry on after
+        out -- a file to write the graph to after every compile
+        clipboard -- copy the graph to the clipboard, if there is one
+    """
+    print(colors.BLUE + "Watching " + compiler.filename + " - press Ctrl+C to stop" + colors.END)
+    seen = {}
+    while True:
+        files = compiler.files()
+        if files != seen:
+            modules_changed = bool(seen) and any(
+                path != compiler.filename and seen.get(path) != modified for path, modified in files.items())
+            start = time.perf_counter()
+            try:
+                result = compiler.compile(modules_changed)
+            except errors as error:
+                print(error)
+            else:
+                elapsed = time.perf_counter() - start
+                if out is not None:
+                    with open(out, "wt", encoding="utf-8") as file:
+                        write_state(result.output, file)
+                copied = clipboard and copy_to_clipboard(result.output)
+                print(colors.GREEN + f"Compiled in {elapsed * 1000:.1f} ms, parsed {result.reparsed} "
+                      f"changed statements" + (" - copied to clipboard" if copied else "") + colors.END)
+            # modules imported for the first time are watched from now on,
+            # and anything saved while compiling is compiled next time round
+            seen = {**compiler.files(), **files}
+        time.sleep(POLL_INTERVAL)
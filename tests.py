@@ -1,10 +1,236 @@
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
 import unittest
-import src.parser.interpreter as interpreter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src", "parser"))
+
+import interpreter  # nopep8
+from Utils import colors  # nopep8
+from cache import ModuleCache  # nopep8
+from imports import STDLIB_DIR  # nopep8
+from results import ResultCache  # nopep8
+
+
+def compile_program(code: str) -> dict:
+    """Compiles a program without the module cache or any console output"""
+    compiler = interpreter.GraphLangInterpreter(code, module_cache=ModuleCache(enabled=False))
+    with contextlib.redirect_stdout(io.StringIO()):
+        compiler.parse_program()
+    return compiler.output
+
+
+def compile_time(code: str) -> float:
+    """Returns the fastest of three compiles of the code"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        compile_program(code)
+        best = min(best, time.perf_counter() - start)
+    return best
 
 
 class TestInterpreter(unittest.TestCase):
     def test_namespace(self):
         '''
-        Write tests here 
+        Write tests here
 
         '''
+
+
+class TestParserStress(unittest.TestCase):
+    """Backtracking over the same tokens must not make parsing take more than linear time"""
+
+    def assert_linear(self, generate, size: int):
+        small = compile_time(generate(size))
+        large = compile_time(generate(size * 4))
+        # 4 times the input should take about 4 times as long, not exponentially longer
+        self.assertLess(large, small * 10 + 0.01)
+
+    def test_nested_brackets(self):
+        def nested(depth):
+            return "x = " + "(" * depth + "1" + ")" * depth + "\n"
+        self.assertEqual(compile_program(nested(30))["expressions"]["list"][0]["latex"],
+                         "x=" + "\\left(" * 30 + "1" + "\\right)" * 30)
+        self.assert_linear(nested, 40)
+
+    def test_nested_points(self):
+        def nested(depth):
+            return "x = " + "(" * depth + "1" + ",1)" * depth + "\n"
+        self.assert_linear(nested, 40)
+
+    def test_long_tuples(self):
+        def polygon(points):
+            return "shape = polygon(" + ",".join(f"(({i}),({i}+1))" for i in range(points)) + ")\n"
+        self.assert_linear(polygon, 500)
+
+    def test_long_operator_chain(self):
+        def chain(operators):
+            return "x = 1" + "".join(f"{'+*-/^'[i % 5]}{i % 7 + 1}" for i in range(operators)) + "\n"
+        # far deeper than the recursion limit
+        latex = compile_program(chain(100_000))["expressions"]["list"][0]["latex"]
+        self.assertEqual(latex, chain(100_000)[:-1].replace(" ", ""))
+        self.assert_linear(chain, 2000)
+
+
+class TestSubexpressionHoister(unittest.TestCase):
+    """-O2 moves calculations repeated in a namespace into helper variables"""
+
+    def hoist(self, code: str) -> tuple[int, list[str]]:
+        """Returns how many helpers were added, and the LaTeX of every expression"""
+        compiler = interpreter.GraphLangInterpreter(code, module_cache=ModuleCache(enabled=False), optimise=2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            compiler.parse_program()
+        expressions = compiler.output["expressions"]["list"]
+        return compiler.hoisted, [expression.get("latex") for expression in expressions]
+
+    def test_repeated_calculation(self):
+        hoisted, latex = self.hoist("x = 1\nns A {\n    b = (x + 2) * 3\n    c = (x + 2) * 4\n}\n")
+        self.assertEqual(hoisted, 1)
+        self.assertEqual(latex[2:], ["A_{b}=A_{cse1}*3", "A_{c}=A_{cse1}*4", "A_{cse1}=A_{x}+2"])
+
+    def test_random_calls(self):
+        # every call to random gives a different value
+        hoisted, _ = self.hoist("x = 1\nns A {\n    b = random(x, 2) * 3\n    c = random(x, 2) * 4\n}\n")
+        self.assertEqual(hoisted, 0)
+
+    def test_function_bodies(self):
+        code = ("x = 1\nns A {\n    fn f(t) {\n        (x + 2) * t\n    }\n"
+                "    fn g(t) {\n        (x + 2) * t * 4\n    }\n}\n")
+        self.assertEqual(self.hoist(code)[0], 0)
+
+    def test_whole_definitions(self):
+        # a helper would only be another name for the same value
+        hoisted, latex = self.hoist("x = 1\nns A {\n    b = rgb(x, 255, 255)\n    c = rgb(x, 255, 255)\n}\n")
+        self.assertEqual(hoisted, 0)
+        self.assertEqual(len(latex), 4)
+        self.assertEqual(self.hoist("import colors\n")[0], 0)
+
+
+class TestIncremental(unittest.TestCase):
+    """Reparsing only the statements that changed must give the same graph as compiling the whole file"""
+
+    EDITS = [
+        "ns N {\n    b = 1\n}\nc = N.b * 3\nd = c\n",
+        "ns N {\n    b = 1\n}\nc = N.b * 3\nd = N.b\ne = (N.b, c)\n",
+        "ns N {\n    b = 2\n}\nc = N.b * 3\nd = N.b\ne = (N.b, c)\n",
+        "ns N {\n    b = 2\n}\nc = sin(N.b)\nd = -N.b\ne = (N.b, c)\n",
+        "x = 1\nns N {\n    b = x\n}\nc = sin(N.b)\nd = -N.b\ne = (N.b, c)\n",
+        "x = 1\nfn f(t) {\n    t * x\n}\nns N {\n    b = f(x)\n}\nc = sin(N.b)\n",
+        "x = 1\nfn f(t) {\n    t * x\n}\nns N {\n    b = f(x)\n",
+        "\nns N {\n    b = 1\nc = 2\n",
+        "import shapes\nfoo = 1\nRectangle!()\nw = foo.width\n",
+    ]
+
+    def compile(self, code: str, previous: dict | None = None):
+        """Returns the graph, or the error, and what parse_incremental returned if previous is given"""
+        compiler = interpreter.GraphLangInterpreter(code, module_cache=ModuleCache(enabled=False), stable_ids=True)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                if previous is None:
+                    compiler.parse_program()
+                else:
+                    previous = compiler.parse_incremental(previous)
+            return compiler.output, previous
+        except interpreter.Error as error:
+            return ("error", error.args[0], error.line_number), previous
+
+    def test_edits_match_full_compiles(self):
+        previous = {}
+        for code in self.EDITS:
+            with self.subTest(code=code):
+                output, previous = self.compile(code, previous)
+                self.assertEqual(output, self.compile(code)[0])
+
+
+class TestResultCache(unittest.TestCase):
+    def run_compiler(self, code: str, result_cache: ResultCache) -> tuple[dict, list[str], str]:
+        """Compiles like the command line does, returning the graph, the warnings and what was printed"""
+        compiler = interpreter.GraphLangInterpreter(code, module_cache=ModuleCache(enabled=False), optimise=2,
+                                                    wakascopes=True, result_cache=result_cache)
+        printed = io.StringIO()
+        excepthook = sys.excepthook
+        try:
+            with contextlib.redirect_stdout(printed):
+                compiler.run(out=io.StringIO(), clipboard=False, interactive=False)
+        finally:
+            sys.excepthook = excepthook
+        return compiler.output, compiler.warnings, printed.getvalue()
+
+    def test_hit_reports_like_a_miss(self):
+        code = ("import missing\nimport colors\nx = 1 + 2\nns A {\n    b = (x + 2) * 3\n    c = (x + 2) * 4\n"
+                "    fn f(t) {\n        (t + 2) * (t + 2)\n    }\n}\n")
+        result_cache = ResultCache()
+        miss = self.run_compiler(code, result_cache)
+        hit = self.run_compiler(code, result_cache)
+        self.assertEqual(result_cache.hits, 1)
+        self.assertEqual(hit[:2], miss[:2])
+        self.assertEqual(hit[2].replace(colors.BLUE + "Compiled before, reused the graph from the result cache"
+                                        + colors.END + "\n", ""), miss[2])
+        self.assertIn("missing", miss[1][0])
+        self.assertIn("hoisted 1 repeated", miss[2])
+        self.assertIn("fn A.f", miss[2])
+
+
+class TestCompileApi(unittest.TestCase):
+    PROGRAMS = [
+        "import shapes\nx = 1\ny = x + 2\n",
+        "ns Outer {\n    a = 3\n    fn f(t) {\n        t * a\n    }\n}\nb = Outer.a * 2\n",
+        "import colors\nmacro Box!(__name__, w) {\n    ns {__name__} {\n        width = {w}\n        area = width * width\n    }\n}\n"
+        "box = Box!(3)\n",
+    ]
+
+    def test_parallel_compiles_match(self):
+        expected = [interpreter.compile(program) for program in self.PROGRAMS]
+        jobs = [self.PROGRAMS[i % len(self.PROGRAMS)] for i in range(60)]
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            # the threads read and write the same compiled modules, in memory and on disk
+            module_cache = ModuleCache(directory=directory)
+            with contextlib.redirect_stdout(output), concurrent.futures.ThreadPoolExecutor(8) as pool:
+                results = list(pool.map(lambda program: interpreter.compile(program, module_cache=module_cache), jobs))
+        for index, result in enumerate(results):
+            self.assertEqual(result, expected[index % len(self.PROGRAMS)])
+        self.assertEqual(output.getvalue(), "")
+
+    def assert_cached_match_fresh(self, modules: dict[str, str], programs: list[str]):
+        """Compiles programs one after another with one module cache, checking each against a compile without it"""
+        with tempfile.TemporaryDirectory() as directory:
+            for name, code in modules.items():
+                with open(os.path.join(directory, name + ".graphlang"), "wt", encoding="utf-8") as file:
+                    file.write(code)
+            import_paths = [directory, STDLIB_DIR]
+            module_cache = ModuleCache(directory=os.path.join(directory, "cache"))
+            for program in programs:
+                with self.subTest(program=program):
+                    self.assertEqual(interpreter.compile(program, import_paths=import_paths, module_cache=module_cache),
+                                     interpreter.compile(program, import_paths=import_paths))
+
+    def test_cached_modules_use_special_variables(self):
+        # __name__ in the module's macro call is the last variable assigned before the import
+        self.assert_cached_match_fresh({"d": "Rectangle!()\n"},
+                                       ["import shapes\nfoo = 1\nimport d\n", "import shapes\nbar = 1\nimport d\n"])
+
+    def test_cached_modules_import_once(self):
+        modules = {"a": "import b\nx = 1\n", "b": "y = 2\n"}
+        self.assert_cached_match_fresh(modules, ["import a\n", "import a\nimport b\n", "import b\nimport a\n",
+                                                 "import a\nimport b\nz = b.y\n"])
+
+    def test_errors(self):
+        with self.assertRaises(interpreter.CompileError) as caught:
+            interpreter.compile("x = 1\ny = (\n", filename="broken.graphlang")
+        self.assertEqual((caught.exception.filename, caught.exception.line), ("broken.graphlang", 2))
+        # programs that end in the middle of a statement
+        for program in ["x = (", "x = 1 +", "ns A {", "z = polygon(", "if x < 1 {", "fn f(a) {\n a\n", "a = 1\nb = ("]:
+            with self.subTest(program=program), self.assertRaises(interpreter.CompileError) as caught:
+                interpreter.compile(program, filename="broken.graphlang")
+            self.assertEqual((caught.exception.message, caught.exception.line),
+                             ("Unexpected end of file", program.rstrip().count("\n") + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()